@@ -1,9 +1,25 @@
+import os
+import sys
+import tempfile
+import time
 import pandas as pd
 import streamlit as st
-import matplotlib.pyplot as plt
 from datetime import datetime
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from charts import render_center
+from episode_catalogue import EpisodeCatalogue
+from memo import build_memo_markdown, episode_summary, latest_rows, memo_inputs, write_bundle
+from drivers import center_drivers, driver_summary, driver_table
+from contagion import rolling_corr_with_peers, stress_matrix, top_correlated_peers, top_leaders
+from regime_stats import REGIMES, regime_stats, rolling_transitions, transition_drift
+from rollups import load_range
+from scenarios import simulate_scenario, summarize_scenario
+from signal_history import HISTORY_DIR, SignalHistory
+import signal_store
+
 st.set_page_config(page_title="VisaOps Risk Console", layout="wide")
 
 st.title("VisaOps Risk Console")
@@ -11,15 +27,49 @@ st.caption("Operational stress monitoring + regime labeling + early-warning epis
 
 
 # ---------- Load data ----------
+# One frame per process, backed by the shared memory-mapped store when present.
+# Keyed on the live store version and the CSV's mtime, so "Latest" follows
+# every publish (signals run or ingest flush)
+def signals_version() -> tuple[str | None, int | None]:
+    csv = Path("data/processed/visaops_signals.csv")
+    return signal_store.current_version(), csv.stat().st_mtime_ns if csv.exists() else None
+
+
+@st.cache_resource(max_entries=2)
+def load_signals(version: tuple[str | None, int | None]):
+    return signal_store.load_signals()
+
+
+# Versioned history: earlier runs, as published. Keyed on the manifest's
+# mtime, so runs committed while the app is up show up on the next rerun
+def history_version() -> int | None:
+    manifest = HISTORY_DIR / "manifest.json"
+    return manifest.stat().st_mtime_ns if manifest.exists() else None
+
+
+@st.cache_resource
+def load_history(version: int | None):
+    history = SignalHistory()
+    return history if history.latest_run is not None else None
+
+
 @st.cache_data
-def load_signals():
-    df = pd.read_csv("data/processed/visaops_signals.csv")
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+def load_as_of(run: int):
+    return load_history(history_version()).as_of(run)
+
+
+# Keyed on the latest signals run, so a pipeline run reloads the catalogue
+@st.cache_resource
+def load_catalogue(signals_run: int | None):
+    cat = EpisodeCatalogue()
+    return cat if len(cat.state) else None
 
 
 @st.cache_data
-def load_episodes():
+def load_episodes(signals_run: int | None):
+    catalogue = load_catalogue(signals_run)
+    if catalogue is not None:
+        return catalogue.episodes
     try:
         ep = pd.read_csv("data/processed/early_warning_episodes.csv")
         ep["stress_start"] = pd.to_datetime(ep["stress_start"])
@@ -29,16 +79,60 @@ def load_episodes():
         return None
 
 
-df = load_signals()
-episodes = load_episodes()
+@st.cache_data
+def load_anomalies():
+    try:
+        an = pd.read_csv("data/processed/visaops_anomalies.csv", parse_dates=["date"])
+        return an[["date", "center", "anomaly_score", "is_anomaly"]]
+    except FileNotFoundError:
+        return None
+
+
+st.sidebar.header("Controls")
+history = load_history(history_version())
+as_of = None
+if history is not None:
+    runs = history.runs()
+    run_labels = {None: "Latest"} | {
+        int(r.run_id): f"Run {r.run_id} — {r.created_at:%Y-%m-%d %H:%M} UTC" for r in runs.iloc[::-1].itertuples()
+    }
+    as_of = st.sidebar.selectbox("As of", list(run_labels), format_func=run_labels.get)
+    if as_of is not None:
+        st.sidebar.caption("Signals as published by this run; episodes and anomaly scores are from the latest run.")
+
+df = load_signals(signals_version()) if as_of is None else load_as_of(as_of)
+anomalies = load_anomalies()
+signals_run = history.latest_run if history is not None else None
+episodes = load_episodes(signals_run)
+catalogue = load_catalogue(signals_run)
+
+
+def center_episodes(c: str) -> pd.DataFrame:
+    if catalogue is not None:
+        return catalogue.lookup(c)
+    return episodes[episodes["center"] == c].sort_values("stress_start")
 centers = sorted(df["center"].unique().tolist())
 
 # ---------- Sidebar ----------
-st.sidebar.header("Controls")
 center = st.sidebar.selectbox("Center", centers, index=0)
 
 d = df[df["center"] == center].sort_values("date").copy()
 
+first_day, last_day = d["date"].min().date(), d["date"].max().date()
+picked = st.sidebar.date_input("Date range", (first_day, last_day), min_value=first_day, max_value=last_day)
+range_start, range_end = (picked[0], picked[-1]) if len(picked) else (first_day, last_day)
+
+
+# Daily rows for short ranges, weekly / monthly rollups for long ones
+@st.cache_data
+def load_view(c: str, start, end, run: int | None = None, version=None):
+    if run is None:
+        return load_range(c, start, end, daily=load_signals(version))
+    return load_range(c, start, end, daily=load_as_of(run), materialized=False)
+
+
+view, resolution = load_view(center, range_start, range_end, as_of, signals_version())
+
 # Current status = last row
 latest = d.iloc[-1]
 regime = str(latest["regime"])
@@ -47,9 +141,20 @@ tat = float(latest["avg_tat_days"])
 queue = float(latest["queue_size"])
 util = float(latest["utilization"])
 
+anomaly = None
+if anomalies is not None:
+    hit = anomalies[(anomalies["center"] == center) & (anomalies["date"] == latest["date"])]
+    anomaly = hit.iloc[0] if len(hit) else None
+
 # ---------- KPIs ----------
-k1, k2, k3, k4, k5 = st.columns(5)
+k1, k6, k2, k3, k4, k5 = st.columns(6)
 k1.metric("Current Regime", regime)
+k6.metric(
+    "Anomaly Score",
+    f"{float(anomaly['anomaly_score']):.2f}" if anomaly is not None else "—",
+    "anomalous" if anomaly is not None and bool(anomaly["is_anomaly"]) else None,
+    delta_color="inverse",
+)
 k2.metric("Stress Index", f"{stress:.2f}")
 k3.metric("Avg TAT (days)", f"{tat:.2f}")
 k4.metric("Queue Size", f"{queue:.0f}")
@@ -58,38 +163,80 @@ k5.metric("Utilization", f"{util:.2f}")
 st.divider()
 
 # ---------- Helper: latest per center ----------
-latest_by_center = (
-    df.sort_values("date")
-      .groupby("center", as_index=False)
-      .tail(1)
-      .sort_values("stress_index", ascending=False)
-      .reset_index(drop=True)
-)
+latest_by_center = latest_rows(df)
+if anomalies is not None:
+    latest_by_center = latest_by_center.merge(anomalies, on=["center", "date"], how="left")
+else:
+    latest_by_center["anomaly_score"] = float("nan")
 
 # ---------- Helper: episode summary ----------
-def episode_summary(ep: pd.DataFrame) -> pd.DataFrame:
-    if ep is None or ep.empty:
-        return pd.DataFrame(columns=["center", "episodes", "early_warnings", "detection_rate", "avg_lead_time_days"])
-
-    rows = []
-    for c, g in ep.groupby("center"):
-        total = len(g)
-        detected = g["lead_time_days"].notna().sum()
-        rate = detected / total if total else 0.0
-        avg_lead = g["lead_time_days"].mean()
-        rows.append(
-            {
-                "center": c,
-                "episodes": total,
-                "early_warnings": int(detected),
-                "detection_rate": round(rate, 2),
-                "avg_lead_time_days": round(avg_lead, 2) if detected > 0 else None,
-            }
-        )
-    return pd.DataFrame(rows).sort_values("center").reset_index(drop=True)
+ep_summary = episode_summary(episodes)
 
 
-ep_summary = episode_summary(episodes)
+@st.cache_data
+def load_scenario(
+    signals: pd.DataFrame,
+    c: str,
+    horizon: int,
+    n_paths: int,
+    capacity_factor: float,
+    demand_factor: float,
+    shock_start_day: int,
+    shock_days: int | None,
+):
+    t0 = time.perf_counter()
+    paths = simulate_scenario(
+        signals,
+        c,
+        horizon=horizon,
+        n_paths=n_paths,
+        capacity_factor=capacity_factor,
+        demand_factor=demand_factor,
+        shock_start_day=shock_start_day,
+        shock_days=shock_days,
+    )
+    return paths, summarize_scenario(paths, horizon), time.perf_counter() - t0
+
+
+@st.cache_data
+def load_contagion(signals: pd.DataFrame, window: int, max_lag: int, k: int):
+    x, _, names = stress_matrix(signals)
+    peers = top_correlated_peers(x, names, window=window, k=k)
+    leaders = top_leaders(x, names, max_lag=max_lag, k=k)
+    return peers, leaders
+
+@st.cache_data
+def load_peer_corr(signals: pd.DataFrame, c: str, peers: tuple[str, ...], window: int):
+    return rolling_corr_with_peers(signals, c, list(peers), window=window)
+
+@st.cache_data
+def load_drivers(signals: pd.DataFrame):
+    table = driver_table(signals)
+    return table, driver_summary(table)
+
+
+driver_tbl, driver_sum = load_drivers(df)
+
+
+@st.cache_data
+def load_regime_stats(signals: pd.DataFrame):
+    transitions, summary = regime_stats(signals)
+    rolling = rolling_transitions(signals)
+    return transitions, summary.merge(transition_drift(rolling), on="center", how="left"), rolling
+
+
+regime_trans, regime_sum, regime_roll = load_regime_stats(df)
+
+# Memo inputs for every center, built once per signals run (the as-of run or
+# the latest) and shared, not copied, across reruns; the generated_at stamp
+# is set per download / bundle
+@st.cache_resource
+def load_memo_inputs(run: int | None, _signals, _episodes, _latest, _drivers, _summary):
+    return memo_inputs(_signals, _episodes, _latest, _drivers, _summary)
+
+
+memo_run = as_of if as_of is not None else signals_run
+memo_in = load_memo_inputs(memo_run, df, episodes, latest_by_center, driver_tbl, driver_sum)
 
 # ---------- Report builders ----------
 def build_status_report_csv() -> str:
@@ -98,54 +245,6 @@ def build_status_report_csv() -> str:
     return rep.to_csv(index=False)
 
 
-def build_memo_markdown(selected_center: str) -> str:
-    dsel = df[df["center"] == selected_center].sort_values("date")
-    last = dsel.iloc[-1]
-
-    ep_c = None
-    if episodes is not None:
-        ep_c = episodes[episodes["center"] == selected_center].sort_values("stress_start")
-
-    lines = []
-    lines.append(f"# VisaOps Risk Memo — {selected_center}")
-    lines.append("")
-    lines.append(f"Generated (UTC): **{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}**")
-    lines.append("")
-    lines.append("## Current Status")
-    lines.append(f"- Regime: **{last['regime']}**")
-    lines.append(f"- Stress Index: **{float(last['stress_index']):.2f}**")
-    lines.append(f"- Avg TAT (days): **{float(last['avg_tat_days']):.2f}**")
-    lines.append(f"- Queue Size: **{float(last['queue_size']):.0f}**")
-    lines.append(f"- Utilization: **{float(last['utilization']):.2f}**")
-    lines.append("")
-    lines.append("## Top Risk Centers (latest day)")
-    lines.append("")
-    top5 = latest_by_center.head(5)[["center", "regime", "stress_index", "avg_tat_days", "queue_size", "utilization"]]
-    lines.append(top5.to_markdown(index=False))
-    lines.append("")
-
-    lines.append("## Early Warning Performance")
-    if episodes is None or episodes.empty:
-        lines.append("_No early-warning episodes file found. Run `python src/early_warning.py`._")
-    else:
-        lines.append("### Summary by Center")
-        lines.append(ep_summary.to_markdown(index=False))
-        lines.append("")
-        lines.append("### Episodes for Selected Center")
-        if ep_c is None or ep_c.empty:
-            lines.append("_No stressed episodes detected for this center._")
-        else:
-            show_cols = ["stress_start", "warning_start", "lead_time_days"]
-            lines.append(ep_c[show_cols].to_markdown(index=False))
-
-    lines.append("")
-    lines.append("## Notes")
-    lines.append("- This demo uses synthetic, non-sensitive operational data.")
-    lines.append("- Stress Index is a weighted combination of utilization, backlog velocity, and TAT volatility (center-normalized).")
-    lines.append("- Regimes are rule-based thresholds on Stress Index (stable/elevated/stressed).")
-    return "\n".join(lines)
-
-
 def get_latest_pdf():
     reports_dir = Path("reports")
     if not reports_dir.exists():
@@ -159,36 +258,32 @@ def get_latest_pdf():
 
 
 # ---------- Tabs ----------
-tab1, tab2, tab3, tab4 = st.tabs(["Monitor", "Early Warning", "Data", "Export"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+    ["Monitor", "Early Warning", "Scenarios", "Contagion", "Data", "Export"]
+)
 
 with tab1:
     st.subheader("Top Risk Centers (latest day)")
     st.dataframe(
-        latest_by_center[["center", "regime", "stress_index", "avg_tat_days", "queue_size", "utilization"]],
+        latest_by_center[["center", "regime", "anomaly_score", "stress_index", "avg_tat_days", "queue_size", "utilization"]],
         use_container_width=True,
     )
 
     st.subheader(f"Stress + Regime Timeline — {center}")
 
-    fig, ax = plt.subplots()
-    ax.plot(d["date"], d["stress_index"], label="Stress Index")
-    ax.axhline(0, linestyle="--", linewidth=1)
+    st.pyplot(render_center(view, center))
+    st.caption(f"{resolution.title()} resolution: {len(view)} rows for {range_start} – {range_end}.")
 
-    regime_colors = {"stable": "#d4f4dd", "elevated": "#fff3cd", "stressed": "#f8d7da"}
-    ymin = float(d["stress_index"].min())
-    ymax = float(d["stress_index"].max())
+    st.subheader(f"Why did stress move? — {center} (last 7d vs prior 7d)")
+    st.write(driver_sum.loc[driver_sum["center"] == center, "summary"].iloc[0])
+    st.dataframe(center_drivers(driver_tbl, center).round(2), use_container_width=True)
 
-    for reg, col in regime_colors.items():
-        mask = (d["regime"] == reg).to_numpy()
-        ax.fill_between(d["date"], ymin, ymax, where=mask, color=col, alpha=0.35, label=reg)
-
-    ax.set_title(f"Operational Stress & Regimes – {center}")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Stress Index")
-    ax.tick_params(axis="x", rotation=30)
-    ax.legend(loc="upper left")
-    fig.tight_layout()
-    st.pyplot(fig, clear_figure=True)
+    st.write("Largest week-over-week moves (network):")
+    movers = driver_sum.reindex(driver_sum["stress_delta"].abs().sort_values(ascending=False).index)
+    st.dataframe(
+        movers[["center", "stress_prev", "stress_last", "stress_delta", "dominant", "summary"]].head(20).round(2),
+        use_container_width=True,
+    )
 
     st.write("Regime counts (this center):")
     st.dataframe(
@@ -196,13 +291,54 @@ with tab1:
         use_container_width=True,
     )
 
+    st.subheader(f"Regime transitions + dwell times — {center}")
+    rs = regime_sum[regime_sum["center"] == center].iloc[0]
+    r1, r2, r3 = st.columns(3)
+    r1.metric("Current regime", rs["current_regime"], f"{int(rs['current_days'])} days in spell", delta_color="off")
+    r2.metric("Expected days to stressed", f"{rs['days_to_stressed']:.1f}")
+    r3.metric("Transition drift (90d)", "—" if pd.isna(rs["drift"]) else f"{rs['drift']:.2f}")
+
+    st.write("Day-over-day transition probabilities (row = from, column = to):")
+    mat = regime_trans[regime_trans["center"] == center].pivot(index="from", columns="to", values="prob")
+    st.dataframe(mat.reindex(index=list(REGIMES), columns=list(REGIMES)).round(2), use_container_width=True)
+
+    st.write("Dwell times (completed spells, days):")
+    st.dataframe(
+        pd.DataFrame(
+            {
+                "regime": REGIMES,
+                "spells": [rs[f"{r}_spells"] for r in REGIMES],
+                "mean_days": [rs[f"{r}_mean_days"] for r in REGIMES],
+                "max_days": [rs[f"{r}_max_days"] for r in REGIMES],
+                "p_stay": [rs[f"p_stay_{r}"] for r in REGIMES],
+            }
+        ).round(2),
+        use_container_width=True,
+    )
+
+    roll = regime_roll[(regime_roll["center"] == center) & (regime_roll["to"] == "stressed")]
+    if not roll.empty:
+        st.write("Rolling 90-day P(→ stressed) by current regime:")
+        st.line_chart(roll.pivot(index="date", columns="from", values="prob"))
+
+    st.write("Closest to stressed (network):")
+    st.dataframe(
+        regime_sum[regime_sum["current_regime"] != "stressed"]
+        .sort_values("days_to_stressed")[
+            ["center", "current_regime", "current_days", "days_to_stressed", "p_stay_stressed", "stressed_mean_days", "drift"]
+        ]
+        .head(20)
+        .round(2),
+        use_container_width=True,
+    )
+
 with tab2:
     st.subheader("Early Warning Episodes")
 
     if episodes is None:
         st.warning("No early warning episodes file found yet. Run: python src/early_warning.py")
     else:
-        ep_c = episodes[episodes["center"] == center].sort_values("stress_start").copy()
+        ep_c = center_episodes(center)
         st.write("Episodes for selected center:")
         st.dataframe(ep_c, use_container_width=True)
 
@@ -220,13 +356,78 @@ with tab2:
         st.dataframe(ep_summary, use_container_width=True)
 
 with tab3:
-    st.subheader("Signals (latest rows)")
-    st.dataframe(d.tail(30), use_container_width=True)
+    st.subheader(f"What-if Scenario — {center}")
+    st.caption("Monte Carlo paths through the queue model, scored with the same stress index and regime thresholds.")
+
+    s1, s2, s3 = st.columns(3)
+    cap_pct = s1.slider("Capacity change (%)", -50, 50, 0, step=5)
+    dem_pct = s2.slider("Demand change (%)", -50, 100, 0, step=5)
+    horizon = s3.slider("Horizon (days)", 7, 120, 60, step=7)
+
+    s4, s5, s6 = st.columns(3)
+    shock_start = s4.number_input("Shock starts on day", min_value=0, max_value=horizon - 1, value=0)
+    shock_days = s5.number_input("Shock duration (days, 0 = whole horizon)", min_value=0, max_value=horizon, value=0)
+    n_paths = s6.select_slider("Paths", options=[1000, 2000, 5000, 10000], value=5000)
+
+    try:
+        paths, summary, elapsed = load_scenario(
+            d, center, horizon, n_paths, 1 + cap_pct / 100, 1 + dem_pct / 100, int(shock_start), int(shock_days) or None
+        )
+    except ValueError as e:  # too little history (new centers)
+        st.info(str(e))
+    else:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("P(stressed within horizon)", f"{summary['p_stressed']:.0%}")
+        m2.metric(
+            "Median days to stressed",
+            f"{summary['days_to_stressed_p50']:.0f}" if pd.notna(summary["days_to_stressed_p50"]) else "—",
+        )
+        m3.metric("Median peak queue", f"{summary['peak_queue_p50']:.0f}")
+
+        st.write("Time to stressed (share of paths):")
+        tts = paths["days_to_stressed"].value_counts(normalize=True).sort_index()
+        st.bar_chart(tts.rename("share"))
+
+        st.write("Peak queue quantiles:")
+        st.dataframe(
+            paths["peak_queue"].quantile([0.1, 0.25, 0.5, 0.75, 0.9]).rename_axis("quantile").reset_index(),
+            use_container_width=True,
+        )
+        st.caption(f"{n_paths} paths simulated in {elapsed:.2f}s.")
+
+with tab4:
+    st.subheader(f"Stress Contagion — {center}")
+    st.caption("Which centers' stress indices move together (rolling correlation) and which lead this one (lagged cross-correlation).")
+
+    c1, c2, c3 = st.columns(3)
+    corr_window = c1.slider("Correlation window (days)", 7, 90, 30, step=1)
+    max_lag = c2.slider("Max lead (days)", 1, 14, 7)
+    top_k = c3.slider("Top peers", 1, 10, 5)
+
+    if len(centers) < 2:
+        st.info("Contagion analysis needs at least two centers.")
+    else:
+        peers, leaders = load_contagion(df, corr_window, max_lag, top_k)
+        peers_c = peers[peers["center"] == center].drop(columns="center")
+        leaders_c = leaders[leaders["center"] == center].drop(columns="center")
+
+        l, r = st.columns(2)
+        l.write("Most correlated peers (latest window):")
+        l.dataframe(peers_c.round(3), use_container_width=True)
+        r.write("Leading centers:")
+        r.dataframe(leaders_c.round(3), use_container_width=True)
+
+        st.write("Rolling correlation with top peers:")
+        st.line_chart(load_peer_corr(df, center, tuple(peers_c["peer"]), corr_window))
+
+with tab5:
+    st.subheader(f"Signals ({resolution}, {range_start} – {range_end})")
+    st.dataframe(view.tail(120), use_container_width=True)
 
     st.subheader("Columns")
     st.write(list(d.columns))
 
-with tab4:
+with tab6:
     st.subheader("Export Reports")
 
     st.write("### Download latest status snapshot (CSV)")
@@ -238,7 +439,7 @@ with tab4:
     )
 
     st.write("### Download memo (Markdown)")
-    memo_md = build_memo_markdown(center)
+    memo_md = build_memo_markdown(center, {**memo_in, "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")})
     st.download_button(
         label=f"Download memo_{center}.md",
         data=memo_md.encode("utf-8"),
@@ -246,6 +447,42 @@ with tab4:
         mime="text/markdown",
     )
 
+    st.write("### Bulk export (ZIP)")
+    st.caption("Memos (Markdown + HTML), driver tables and a status snapshot, generated in parallel and written into the archive as they finish.")
+    b1, b2 = st.columns(2)
+    bulk_regimes = b1.multiselect("Regimes", list(REGIMES), default=list(REGIMES))
+    bulk_centers = b2.multiselect("Centers (empty = all in selected regimes)", centers)
+    selected = latest_by_center[latest_by_center["regime"].isin(bulk_regimes)]["center"]
+    if bulk_centers:
+        selected = selected[selected.isin(bulk_centers)]
+    selected = sorted(selected)
+
+    if st.button(f"Build bundle for {len(selected)} centers", disabled=not selected):
+        previous = st.session_state.pop("bundle", None)
+        if previous is not None:
+            previous[0].close()
+        t0 = time.perf_counter()
+        # streamed into an anonymous temp file: removed by the OS once closed
+        # (next build, or when the session is dropped), read only on download
+        f = tempfile.TemporaryFile(prefix="visaops_bundle_", suffix=".zip")
+        n_files = write_bundle({**memo_in, "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")}, f, selected)
+        st.session_state["bundle"] = (f, n_files, time.perf_counter() - t0)
+
+    if "bundle" in st.session_state:
+        bundle, n_files, secs = st.session_state["bundle"]
+        st.write(f"{n_files} files, {os.fstat(bundle.fileno()).st_size / 1e6:.1f} MB, built in {secs:.1f}s")
+
+        def read_bundle() -> bytes:
+            bundle.seek(0)
+            return bundle.read()
+
+        st.download_button(
+            label="Download visaops_bundle.zip",
+            data=read_bundle,
+            file_name=f"visaops_bundle_{datetime.utcnow():%Y%m%d_%H%M}.zip",
+            mime="application/zip",
+        )
+
     st.write("### Download latest PDF report")
     latest_pdf = get_latest_pdf()
     if latest_pdf is None:
@@ -0,0 +1,312 @@
+"""
+Multivariate anomaly detection on the `add_signals` feature columns.
+
+The stress index only scores the patterns it was designed for. Here an
+IsolationForest learns what normal days look like from all engineered
+features, either:
+- per cluster of centers (default): features are robust-scaled per center
+  (median / IQR) and centers with similar operating profiles share a model
+- per center: one model per center
+
+Models are trained on rows before the start of the current month and
+cached on disk keyed by a hash of their training rows and parameters, so a
+daily run only loads models and scores. Retraining happens when the
+training data changes (at most monthly, or when history is revised).
+Missing models are fitted in parallel with joblib. Scoring is batched: all
+unscored rows of a group go through its model in one call. Each mode keeps
+its models in its own subdirectory, so switching modes does not evict the
+other mode's cache.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/visaops_anomalies.csv, data/processed/anomaly_models/<mode>/
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.ensemble import IsolationForest
+
+FEATURES = [
+    "avg_tat_days",
+    "queue_size",
+    "utilization",
+    "queue_delta",
+    "tat_mean_7d",
+    "tat_std_7d",
+    "queue_mean_7d",
+    "queue_vel_mean_7d",
+    "util_mean_7d",
+    "tat_mean_14d",
+    "tat_std_14d",
+    "queue_mean_14d",
+    "queue_vel_mean_14d",
+    "util_mean_14d",
+]
+
+MODEL_DIR = Path("data/processed/anomaly_models")
+OUTPUT_PATH = Path("data/processed/visaops_anomalies.csv")
+ANOMALY_COLUMNS = ["date", "center", "group", "anomaly_score", "is_anomaly"]
+
+DEFAULT_PARAMS = {"n_estimators": 200, "max_samples": "auto", "contamination": 0.02, "random_state": 42}
+
+
+# -------------------------------------------------
+# Training data + grouping
+# -------------------------------------------------
+
+def training_cutoff(dates: pd.Series) -> pd.Timestamp:
+    """Start of the month of the latest date: models change at most monthly."""
+    return pd.Timestamp(dates.max()).to_period("M").to_timestamp()
+
+
+def training_mask(df: pd.DataFrame, cutoff: pd.Timestamp, min_rows: int = 28) -> np.ndarray:
+    """
+    Rows before `cutoff`; centers with fewer than `min_rows` such rows
+    train on everything they have.
+    """
+    before = (df["date"] < cutoff).to_numpy()
+    n_before = pd.Series(before).groupby(df["center"].to_numpy()).transform("sum").to_numpy()
+    return before | (n_before < min_rows)
+
+
+def robust_scale(df: pd.DataFrame, train: np.ndarray) -> np.ndarray:
+    """Per-center (x - median) / IQR with statistics from training rows."""
+    x = df[FEATURES].astype(float)
+    g = x[train].groupby(df.loc[train, "center"])
+    med = g.median()
+    iqr = g.quantile(0.75) - g.quantile(0.25)
+    iqr = iqr.where(iqr > 1e-9, 1.0)  # constant feature (up to float noise)
+    centers = df["center"]
+    return ((x - med.reindex(centers).to_numpy()) / iqr.reindex(centers).to_numpy()).to_numpy()
+
+
+def assign_groups(
+    df: pd.DataFrame,
+    train: np.ndarray,
+    mode: str = "cluster",
+    centers_per_cluster: int = 50,
+    seed: int = 42,
+) -> pd.Series:
+    """
+    Group label per center. Clusters come from KMeans on each center's
+    (log) training medians, so centers with similar scale and mix of
+    activity share a model.
+    """
+    centers = sorted(df["center"].unique())
+    if mode == "center":
+        return pd.Series(centers, index=centers, dtype=object)
+
+    k = max(1, int(np.ceil(len(centers) / centers_per_cluster)))
+    if k == 1:
+        return pd.Series("cluster_000", index=centers, dtype=object)
+
+    profile = np.log1p(df.loc[train, FEATURES].clip(lower=0).groupby(df.loc[train, "center"]).median())
+    profile = profile.reindex(centers)
+    z = (profile - profile.mean()) / profile.std().replace(0, 1.0)
+    labels = KMeans(n_clusters=k, n_init=4, random_state=seed).fit_predict(z.fillna(0.0).to_numpy())
+    return pd.Series([f"cluster_{i:03d}" for i in labels], index=centers, dtype=object)
+
+
+# -------------------------------------------------
+# Model cache
+# -------------------------------------------------
+
+def data_key(group: str, centers: list[str], raw: np.ndarray, params: dict) -> str:
+    """
+    Hash of a group's raw training rows, membership and model parameters.
+    Values are rounded first so float noise from recomputing the rolling
+    features (or a CSV round trip) does not force a retrain.
+    """
+    h = hashlib.sha1()
+    h.update(json.dumps({"group": group, "centers": centers, "features": FEATURES, "params": params}).encode())
+    h.update(np.ascontiguousarray(np.round(raw, 6), dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _fit(x: np.ndarray, params: dict, path: Path) -> Path:
+    model = IsolationForest(n_jobs=1, **params).fit(x)
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(model, tmp)
+    tmp.replace(path)
+    return path
+
+
+def fit_models(
+    df: pd.DataFrame,
+    x: np.ndarray,
+    train: np.ndarray,
+    groups: pd.Series,
+    model_dir: str | Path = MODEL_DIR,
+    params: dict | None = None,
+    n_jobs: int = -1,
+) -> tuple[dict[str, Path], int]:
+    """
+    Model path per group, fitting (in parallel) only the groups whose
+    training-data key has no cached model. Groups without a complete
+    training row (e.g. centers too new for the rolling features) get no
+    model and are left out of `paths`. Returns (paths, n_fitted).
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    raw = df[FEATURES].to_numpy(dtype=float)
+    row_group = df["center"].map(groups).to_numpy()
+    paths, todo = {}, []
+    for group, centers in groups.groupby(groups).groups.items():
+        sel = train & (row_group == group)
+        key = data_key(group, sorted(centers), raw[sel], params)
+        xg = x[sel]
+        xg = xg[~np.isnan(xg).any(axis=1)]
+        if not len(xg):
+            continue
+        path = model_dir / f"{group}-{key}.joblib"
+        paths[group] = path
+        if not path.exists():
+            todo.append((xg, path))
+
+    if todo:
+        joblib.Parallel(n_jobs=n_jobs)(joblib.delayed(_fit)(xg, params, path) for xg, path in todo)
+
+    # drop cached models no longer referenced by any group (model_dir holds one mode)
+    live = set(paths.values())
+    for old in model_dir.glob("*.joblib"):
+        if old not in live:
+            old.unlink()
+    return paths, len(todo)
+
+
+# -------------------------------------------------
+# Scoring
+# -------------------------------------------------
+
+def score(
+    df: pd.DataFrame,
+    mode: str = "cluster",
+    model_dir: str | Path = MODEL_DIR,
+    since: pd.Series | None = None,
+    params: dict | None = None,
+    n_jobs: int = -1,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Anomaly scores for rows of `df` (signals) after `since` (per-center last
+    scored date; None = all rows). anomaly_score is the negated
+    IsolationForest score (higher = more unusual); is_anomaly flags rows
+    beyond the model's contamination threshold.
+    """
+    df = df.sort_values(["center", "date"]).reset_index(drop=True)
+    df["date"] = pd.to_datetime(df["date"])
+
+    cutoff = training_cutoff(df["date"])
+    train = training_mask(df, cutoff)
+    x = robust_scale(df, train) if mode == "cluster" else df[FEATURES].to_numpy(dtype=float)
+    groups = assign_groups(df, train, mode)
+
+    t0 = time.perf_counter()
+    paths, n_fitted = fit_models(df, x, train, groups, Path(model_dir) / mode, params, n_jobs)
+    fit_s = time.perf_counter() - t0
+
+    todo = np.ones(len(df), dtype=bool)
+    if since is not None:
+        last = since.reindex(df["center"]).to_numpy(dtype="datetime64[ns]")
+        todo = np.isnat(last) | (df["date"].to_numpy() > last)
+    todo &= ~np.isnan(x).any(axis=1)
+    # groups without a model stay unscored (picked up once they have training rows)
+    row_group = df["center"].map(groups).to_numpy()
+    todo &= np.isin(row_group, list(paths))
+
+    t0 = time.perf_counter()
+    scores = np.full(len(df), np.nan)
+    flags = np.zeros(len(df), dtype=bool)
+    for group, path in paths.items():
+        sel = np.flatnonzero(todo & (row_group == group))
+        if len(sel):
+            model = joblib.load(path)
+            # one pass through the forest: decision_function = score_samples - offset_
+            s = model.score_samples(x[sel])
+            scores[sel] = -s
+            flags[sel] = s - model.offset_ < 0
+    score_s = time.perf_counter() - t0
+
+    out = pd.DataFrame(
+        {
+            "date": df["date"],
+            "center": df["center"],
+            "group": row_group,
+            "anomaly_score": scores,
+            "is_anomaly": flags,
+        }
+    )[todo]
+    stats = {
+        "train_cutoff": cutoff.date().isoformat(),
+        "groups": len(paths),
+        "groups_skipped": groups.nunique() - len(paths),
+        "models_fitted": n_fitted,
+        "rows_scored": int(todo.sum()),
+        "fit_seconds": round(fit_s, 3),
+        "score_seconds": round(score_s, 3),
+    }
+    return out.reset_index(drop=True), stats
+
+
+def update_anomalies(
+    df: pd.DataFrame,
+    out_path: str | Path = OUTPUT_PATH,
+    mode: str = "cluster",
+    model_dir: str | Path = MODEL_DIR,
+    rescore: bool = False,
+    n_jobs: int = -1,
+) -> tuple[pd.DataFrame, dict]:
+    """Score only rows newer than what `out_path` already holds and append them."""
+    out_path = Path(out_path)
+    old = None
+    if out_path.exists() and not rescore:
+        old = pd.read_csv(out_path, parse_dates=["date"])
+        old_mode = "cluster" if old["group"].astype(str).str.startswith("cluster_").all() else "center"
+        if old.empty or old_mode != mode:
+            old = None  # scored under another grouping mode
+
+    since = old.groupby("center")["date"].max() if old is not None else None
+    new, stats = score(df, mode, model_dir, since=since, n_jobs=n_jobs)
+
+    out = pd.concat([old, new], ignore_index=True) if old is not None else new
+    out = out.sort_values(["center", "date"]).reset_index(drop=True)[ANOMALY_COLUMNS]
+    tmp = out_path.with_suffix(".tmp")
+    out.to_csv(tmp, index=False, date_format="%Y-%m-%d")
+    tmp.replace(out_path)
+    return out, stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score anomalies on signal features for every center.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--output", default=str(OUTPUT_PATH), help="Anomaly scores CSV")
+    parser.add_argument("--mode", default="cluster", choices=("cluster", "center"), help="One model per cluster or per center")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR), help="Model cache directory (one subdirectory per mode)")
+    parser.add_argument("--rescore", action="store_true", help="Score all rows, not just new ones")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fitting jobs")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+
+    t0 = time.perf_counter()
+    out, stats = update_anomalies(df, args.output, args.mode, args.model_dir, args.rescore, args.jobs)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Anomaly scoring done in {elapsed:.2f}s -> {args.output}")
+    print(", ".join(f"{k}={v}" for k, v in stats.items()))
+    latest = out.sort_values("date").groupby("center").tail(1)
+    print(latest.sort_values("anomaly_score", ascending=False).head(10).round({"anomaly_score": 3}).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Stress index + regime charts shared by every plotting entry point.
+
+One chart = stress index line, zero line and regime shading. Charts keep
+their figure and artists alive and are redrawn by updating line data and
+shading polygons, so rendering many centers does not rebuild a figure per
+call. Supports:
+- a single center (CLI scripts, PDF report, dashboard)
+- a grid of small multiples for many centers in one PNG
+- one PNG per center fanned out to a process pool
+
+Figures are built with `matplotlib.figure.Figure` (no pyplot state), so
+reused charts never accumulate in pyplot's figure registry.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")  # headless backend
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+
+REGIME_COLORS = {
+    "stable": "#d4f4dd",
+    "elevated": "#fff3cd",
+    "stressed": "#f8d7da",
+}
+
+
+def safe_name(label: str) -> str:
+    """
+    File-name-safe form of a center label. Labels that had to be sanitized
+    get a short hash suffix, so "A B" and "A_B" do not collide.
+    """
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+    if safe != label:
+        safe += "-" + hashlib.sha1(label.encode()).hexdigest()[:8]
+    return safe
+
+
+class StressChart:
+    """Stress line + regime shading on one axes, updated in place."""
+
+    def __init__(self, ax, legend: bool = True):
+        self.ax = ax
+        self.shading = {}
+        for regime, color in REGIME_COLORS.items():
+            coll = PolyCollection([], facecolor=color, edgecolor="none", alpha=0.6, zorder=0)
+            ax.add_collection(coll)
+            self.shading[regime] = coll
+
+        (self.line,) = ax.plot([], [], linewidth=1.5, color="#1f4e79", label="Stress Index", zorder=2)
+        ax.axhline(0, linestyle="--", linewidth=0.8, color="gray", zorder=1)
+
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+        if legend:
+            handles = [self.line] + [
+                Patch(facecolor=c, label=r, alpha=0.6) for r, c in REGIME_COLORS.items()
+            ]
+            ax.legend(handles=handles, loc="upper left", fontsize="small")
+
+    def update(self, d: pd.DataFrame, title: str) -> None:
+        """
+        Redraw for `d` (one center: date, stress_index, regime). Rows may be
+        daily or rollup periods; shading spans the typical row spacing.
+        """
+        d = d.sort_values("date")
+        x = mdates.date2num(pd.to_datetime(d["date"]).to_numpy())
+        y = d["stress_index"].to_numpy(dtype=float)
+        self.line.set_data(x, y)
+
+        if len(x) == 0:
+            for coll in self.shading.values():
+                coll.set_verts([])
+            self.ax.set_title(title)
+            return
+
+        finite = y[np.isfinite(y)]
+        if len(finite):
+            ymin, ymax = float(finite.min()), float(finite.max())
+        else:  # too little history for a stress index yet
+            ymin, ymax = -1.0, 1.0
+        pad = 0.05 * (ymax - ymin or 1.0)
+        lo, hi = ymin - pad, ymax + pad
+
+        # One rectangle per run of consecutive rows in the same regime,
+        # extended half a row (half a day for daily data) on each side.
+        half = 0.5 * (float(np.median(np.diff(x))) if len(x) > 1 else 1.0)
+        regimes = d["regime"].to_numpy()
+        change = np.flatnonzero(regimes[1:] != regimes[:-1]) + 1
+        starts = np.concatenate([[0], change])
+        ends = np.concatenate([change - 1, [len(x) - 1]])
+        for regime, coll in self.shading.items():
+            sel = regimes[starts] == regime
+            x0 = x[starts[sel]] - half
+            x1 = x[ends[sel]] + half
+            coll.set_verts([[(a, lo), (b, lo), (b, hi), (a, hi)] for a, b in zip(x0, x1)])
+
+        self.ax.set_xlim(x[0] - half, x[-1] + half)
+        self.ax.set_ylim(lo, hi)
+        self.ax.set_title(title)
+
+
+def new_chart(figsize: tuple[float, float] = (10, 4), legend: bool = True) -> tuple[Figure, StressChart]:
+    """
+    Single-center figure. Margins are fixed rather than recomputed by a
+    layout engine on every save, which keeps reused figures cheap to redraw.
+    """
+    fig = Figure(figsize=figsize)
+    fig.subplots_adjust(left=0.08, right=0.98, bottom=0.14, top=0.9)
+    ax = fig.add_subplot()
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Stress Index")
+    return fig, StressChart(ax, legend=legend)
+
+
+def render_center(
+    df: pd.DataFrame,
+    center: str,
+    out_path: str | Path | None = None,
+    figsize: tuple[float, float] = (10, 4),
+    dpi: int = 150,
+    chart: tuple[Figure, StressChart] | None = None,
+) -> Figure:
+    """
+    Draw the stress & regime timeline for one center. Pass `chart` (from
+    `new_chart`) to reuse an existing figure. Saves to `out_path` if given
+    and returns the figure.
+    """
+    fig, c = chart or new_chart(figsize)
+    c.update(df[df["center"] == center], f"Operational Stress & Regimes – {center}")
+
+    if out_path is not None:
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(out_path, dpi=dpi)
+    return fig
+
+
+def render_grid(
+    df: pd.DataFrame,
+    centers: list[str],
+    out_path: str | Path | None = None,
+    ncols: int = 4,
+    panel_size: tuple[float, float] = (4, 2.2),
+    dpi: int = 120,
+) -> Figure:
+    """Small multiples: one panel per center in a single figure."""
+    ncols = max(1, min(ncols, len(centers)))
+    nrows = max(1, math.ceil(len(centers) / ncols))
+    fig = Figure(figsize=(panel_size[0] * ncols, panel_size[1] * nrows), layout="constrained")
+    axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+
+    groups = dict(tuple(df[df["center"].isin(centers)].groupby("center")))
+    for ax, center in zip(axes, centers):
+        chart = StressChart(ax, legend=False)
+        chart.update(groups.get(center, df.iloc[:0]), center)
+        ax.tick_params(labelsize="x-small")
+    for ax in axes[len(centers):]:
+        ax.set_visible(False)
+
+    if out_path is not None:
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(out_path, dpi=dpi)
+    return fig
+
+
+# -------------------------------------------------
+# Batch rendering (process pool)
+# -------------------------------------------------
+
+_WORKER_GROUPS: dict[str, pd.DataFrame] = {}
+
+
+def _init_worker(df: pd.DataFrame) -> None:
+    global _WORKER_GROUPS
+    _WORKER_GROUPS = dict(tuple(df.groupby("center")))
+
+
+def _render_chunk(centers: list[str], out_dir: str, dpi: int) -> list[str]:
+    fig, chart = new_chart()
+    paths = []
+    for center in centers:
+        path = Path(out_dir) / f"stress_regime_{safe_name(center)}.png"
+        chart.update(_WORKER_GROUPS[center], f"Operational Stress & Regimes – {center}")
+        fig.savefig(path, dpi=dpi)
+        paths.append(str(path))
+    return paths
+
+
+def _chunks(centers: list[str], n: int) -> list[list[str]]:
+    return [list(c) for c in np.array_split(np.asarray(centers, dtype=object), n) if len(c)]
+
+
+def render_centers(
+    df: pd.DataFrame,
+    centers: list[str],
+    out_dir: str | Path,
+    processes: int | None = None,
+    dpi: int = 100,
+) -> list[str]:
+    """
+    One PNG per center in `out_dir`. Centers are split into one chunk per
+    worker; each worker builds a single figure and reuses it for its chunk.
+    `processes=1` renders in-process.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df = df[df["center"].isin(centers)][["date", "center", "stress_index", "regime"]]
+
+    processes = processes or os.cpu_count() or 1
+    chunks = _chunks(centers, processes)
+
+    if processes == 1:
+        _init_worker(df)
+        return [p for chunk in chunks for p in _render_chunk(chunk, str(out_dir), dpi)]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(df,)) as pool:
+        results = pool.map(_render_chunk, chunks, [str(out_dir)] * len(chunks), [dpi] * len(chunks))
+        return [p for chunk in results for p in chunk]
+
+
+def benchmark(
+    df: pd.DataFrame,
+    out_dir: str | Path,
+    n_charts: int = 100,
+    processes: int | None = None,
+) -> pd.DataFrame:
+    """
+    Charts per second for three strategies on the first `n_charts` centers
+    (cycled if there are fewer): a new figure per chart, one reused figure,
+    and reused figures across a process pool. Every row renders the same
+    charts; the pool row excludes worker startup.
+    """
+    names = sorted(df["center"].unique())
+    labels = [f"{names[i % len(names)]}" for i in range(n_charts)]
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    groups = dict(tuple(df.groupby("center")))
+
+    rows = []
+
+    t0 = time.perf_counter()
+    for i, center in enumerate(labels):
+        fig, chart = new_chart()
+        chart.update(groups[center], center)
+        fig.savefig(out_dir / f"bench_new_{i}.png", dpi=100)
+    rows.append(("new figure per chart", 1, time.perf_counter() - t0))
+
+    t0 = time.perf_counter()
+    fig, chart = new_chart()
+    for i, center in enumerate(labels):
+        chart.update(groups[center], center)
+        fig.savefig(out_dir / f"bench_reuse_{i}.png", dpi=100)
+    rows.append(("reused figure", 1, time.perf_counter() - t0))
+
+    processes = processes or os.cpu_count() or 1
+    chunks = _chunks(labels, processes)
+    cols = df[["date", "center", "stress_index", "regime"]]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(cols,)) as pool:
+        # start every worker (running its initializer) before the clock starts
+        list(pool.map(time.sleep, [0.2] * processes))
+        t0 = time.perf_counter()
+        list(pool.map(_render_chunk, chunks, [str(out_dir)] * len(chunks), [100] * len(chunks)))
+        rows.append(("reused figure, process pool", processes, time.perf_counter() - t0))
+
+    out = pd.DataFrame(rows, columns=["strategy", "processes", "seconds"])
+    out["charts"] = n_charts
+    out["charts_per_sec"] = (out["charts"] / out["seconds"]).round(1)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render stress & regime charts.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--centers", nargs="*", default=None, help="Centers to render (default: all)")
+    parser.add_argument("--out-dir", default="reports/charts", help="Output directory for per-center PNGs")
+    parser.add_argument("--grid", default=None, help="Also write a small-multiples PNG to this path")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N", help="Benchmark N charts instead")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    df["date"] = pd.to_datetime(df["date"])
+
+    if args.benchmark:
+        print(benchmark(df, Path(args.out_dir) / "bench", args.benchmark, args.processes).to_string(index=False))
+        return
+
+    centers = args.centers or sorted(df["center"].unique())
+    t0 = time.perf_counter()
+    paths = render_centers(df, centers, args.out_dir, processes=args.processes)
+    elapsed = time.perf_counter() - t0
+    print(f"Saved {len(paths)} charts -> {args.out_dir} ({len(paths) / elapsed:.1f} charts/s)")
+
+    if args.grid:
+        render_grid(df, centers, args.grid)
+        print(f"Saved grid -> {args.grid}")
+
+
+if __name__ == "__main__":
+    main()
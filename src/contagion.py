@@ -0,0 +1,257 @@
+"""
+Cross-center stress contagion analysis.
+
+Pivots `stress_index` into a dates x centers matrix and computes
+- rolling pairwise correlations (which centers move together), and
+- lagged cross-correlations (which centers lead others),
+returning the top-k peers / leaders per center.
+
+All pairwise work is done in blocks of centers sized to a fixed element
+budget, so memory stays bounded at O(block x N) per evaluation instead of
+the full N^2 x T tensor, and the analysis scales to thousands of centers.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/contagion_peers.csv, data/processed/contagion_leaders.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on elements in any blocked intermediate result
+MAX_BLOCK_ELEMENTS = 2**22
+
+
+def stress_matrix(
+    df: pd.DataFrame,
+    value_col: str = "stress_index",
+) -> tuple[np.ndarray, pd.DatetimeIndex, list[str]]:
+    """
+    Dates x centers matrix of `value_col`. Gaps are forward/back filled
+    within each center so the pairwise statistics stay defined.
+    """
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"])
+    wide = d.pivot(index="date", columns="center", values=value_col).sort_index()
+    wide = wide.ffill().bfill()
+    return wide.to_numpy(dtype=float), wide.index, wide.columns.tolist()
+
+
+def _block_size(n_rows: int, n_centers: int, budget: int = MAX_BLOCK_ELEMENTS) -> int:
+    return int(max(1, min(n_centers, budget // max(1, n_rows * n_centers))))
+
+
+def _rolling_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window sums along axis 0 via cumulative sums."""
+    c = np.cumsum(x, axis=0)
+    out = c[window - 1 :].copy()
+    out[1:] -= c[:-window]
+    return out
+
+
+def rolling_corr_block(
+    x: np.ndarray,
+    cols: np.ndarray | slice,
+    window: int = 30,
+) -> np.ndarray:
+    """
+    Daily rolling Pearson correlation of the centers in `cols` against every
+    center. Returns a (T - window + 1, len(cols), N) array; keep `cols`
+    small (e.g. one center for a timeline view).
+    """
+    x = x - x.mean(axis=0)  # centering keeps the cumsum differences stable
+    xb = x[:, cols]
+
+    s_all = _rolling_sums(x, window)
+    ss_all = _rolling_sums(x * x, window)
+    s_b = s_all[:, cols]
+    ss_b = ss_all[:, cols]
+    s_cross = _rolling_sums(xb[:, :, None] * x[:, None, :], window)
+
+    cov = window * s_cross - s_b[:, :, None] * s_all[:, None, :]
+    var_b = window * ss_b - s_b**2
+    var_all = window * ss_all - s_all**2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / np.sqrt(var_b[:, :, None] * var_all[:, None, :])
+    return np.clip(np.nan_to_num(corr, nan=0.0), -1.0, 1.0)
+
+
+def _top_k(values: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k largest entries along axis 1, sorted."""
+    idx = np.argpartition(-values, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(values, idx, axis=1)
+    order = np.argsort(-vals, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+
+def _standardize(a: np.ndarray) -> np.ndarray:
+    std = a.std(axis=0)
+    return (a - a.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+
+def top_correlated_peers(
+    x: np.ndarray,
+    centers: list[str],
+    window: int = 30,
+    step: int = 7,
+    k: int = 5,
+    budget: int = MAX_BLOCK_ELEMENTS,
+) -> pd.DataFrame:
+    """
+    Top-k most correlated peers per center, ranked by the correlation over
+    the latest `window` days.
+
+    The rolling correlation is evaluated every `step` days (default: weekly,
+    so consecutive windows overlap; `step=window` gives non-overlapping
+    block correlations) on windows ending on the latest date, and
+    `corr_mean` is its average over the history. Each evaluation is a
+    (block x N) matrix product on a window standardized on the fly, so only
+    one window and block-sized results are held.
+    """
+    n_dates, n_centers = x.shape
+    window = min(window, n_dates)
+    step = max(1, min(step, window))
+    k = min(k, n_centers - 1)
+    if k < 1:
+        return pd.DataFrame(columns=["center", "rank", "peer", "corr_latest", "corr_mean"])
+
+    ends = list(range(n_dates, window - 1, -step))[::-1]
+
+    block = _block_size(1, n_centers, budget)
+    frames = []
+
+    for start in range(0, n_centers, block):
+        cols = np.arange(start, min(start + block, n_centers))
+        total = np.zeros((len(cols), n_centers))
+
+        # windows are standardized per block rather than all up front, so
+        # only one (window x N) copy is alive at a time
+        for end in ends:
+            z = _standardize(x[end - window : end])
+            latest = z[:, cols].T @ z / window
+            total += latest
+
+        mean = total / len(ends)
+        latest = latest.copy()
+        latest[np.arange(len(cols)), cols] = -np.inf
+
+        idx, vals = _top_k(latest, k)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "center": np.repeat(np.asarray(centers)[cols], k),
+                    "rank": np.tile(np.arange(1, k + 1), len(cols)),
+                    "peer": np.asarray(centers)[idx.ravel()],
+                    "corr_latest": vals.ravel(),
+                    "corr_mean": np.take_along_axis(mean, idx, axis=1).ravel(),
+                }
+            )
+        )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def top_leaders(
+    x: np.ndarray,
+    centers: list[str],
+    max_lag: int = 7,
+    k: int = 5,
+    budget: int = MAX_BLOCK_ELEMENTS,
+) -> pd.DataFrame:
+    """
+    Top-k leading centers per center from lagged cross-correlations.
+
+    Center i leads center j at lag l when corr(x_i[t - l], x_j[t]) is high.
+    For each (i, j) the best lag in 1..max_lag is kept. Work is blocked over
+    the follower centers j, so only (N x block) correlations are held at once.
+    """
+    n_dates, n_centers = x.shape
+    max_lag = min(max_lag, n_dates - 3)
+    k = min(k, n_centers - 1)
+    if k < 1 or max_lag < 1:
+        return pd.DataFrame(columns=["center", "rank", "leader", "lag_days", "xcorr"])
+
+    block = _block_size(1, n_centers, budget)
+    frames = []
+
+    for start in range(0, n_centers, block):
+        cols = np.arange(start, min(start + block, n_centers))
+        best = np.full((n_centers, len(cols)), -np.inf)
+        best_lag = np.zeros((n_centers, len(cols)), dtype=int)
+
+        for lag in range(1, max_lag + 1):
+            lead = _standardize(x[:-lag])
+            follow = _standardize(x[lag:, cols])
+            xc = lead.T @ follow / (n_dates - lag)
+            better = xc > best
+            best = np.where(better, xc, best)
+            best_lag = np.where(better, lag, best_lag)
+
+        best[cols, np.arange(len(cols))] = -np.inf
+
+        # (followers, leaders) orientation for the per-center top-k
+        idx, vals = _top_k(best.T, k)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "center": np.repeat(np.asarray(centers)[cols], k),
+                    "rank": np.tile(np.arange(1, k + 1), len(cols)),
+                    "leader": np.asarray(centers)[idx.ravel()],
+                    "lag_days": np.take_along_axis(best_lag.T, idx, axis=1).ravel(),
+                    "xcorr": vals.ravel(),
+                }
+            )
+        )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def rolling_corr_with_peers(
+    df: pd.DataFrame,
+    center: str,
+    peers: list[str],
+    window: int = 30,
+) -> pd.DataFrame:
+    """Dates x peers frame of rolling correlation between `center` and `peers`."""
+    x, dates, centers = stress_matrix(df)
+    window = min(window, len(dates))
+    i = centers.index(center)
+    cols = [centers.index(p) for p in peers]
+
+    corr = rolling_corr_block(x, np.array([i]), window)[:, 0, cols]
+    return pd.DataFrame(corr, index=dates[window - 1 :], columns=peers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cross-center stress contagion analysis.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--window", type=int, default=30, help="Rolling correlation window (days)")
+    parser.add_argument("--max-lag", type=int, default=7, help="Maximum lead/lag in days")
+    parser.add_argument("--top", type=int, default=5, help="Peers / leaders kept per center")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    x, _, centers = stress_matrix(df)
+
+    t0 = time.perf_counter()
+    peers = top_correlated_peers(x, centers, window=args.window, k=args.top)
+    leaders = top_leaders(x, centers, max_lag=args.max_lag, k=args.top)
+    elapsed = time.perf_counter() - t0
+
+    peers.to_csv("data/processed/contagion_peers.csv", index=False)
+    leaders.to_csv("data/processed/contagion_leaders.csv", index=False)
+
+    print(f"Contagion analysis for {len(centers)} centers in {elapsed:.2f}s")
+    print("\nTop correlated peers")
+    print(peers.head(15).round(3).to_string(index=False))
+    print("\nTop leaders")
+    print(leaders.head(15).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,37 @@ Creates a small, non-sensitive dataset for development/testing:
 date, center, demand_apps, capacity_apps, processed_apps, queue_size, avg_tat_days
 """
 
-
+DAILY_COLUMNS = [
+    "date",
+    "center",
+    "demand_apps",
+    "capacity_apps",
+    "processed_apps",
+    "queue_size",
+    "avg_tat_days",
+]
+
+# Queue model constants (shared with the scenario engine)
+MIN_DAILY_APPS = 50.0
+TAT_BASE_DAYS = 3.0
+TAT_DAYS_PER_QUEUED_APP = 0.015
+TAT_NOISE_SD = 0.3
+MIN_TAT_DAYS = 1.0
+
+
+def step_queue(queue, demand, capacity):
+    """
+    One day of the queue model. Works on scalars or arrays (e.g. many
+    simulated paths at once). Returns (processed, new_queue).
+    """
+    processed = np.minimum(demand + queue, capacity)
+    queue = np.maximum(0.0, queue + demand - processed)
+    return processed, queue
+
+
+def tat_from_queue(queue, noise):
+    """Simple TAT relationship: grows with the queue."""
+    return np.maximum(MIN_TAT_DAYS, TAT_BASE_DAYS + TAT_DAYS_PER_QUEUED_APP * queue + noise)
 
 
 def generate_daily_ops(
@@ -28,14 +58,11 @@ def generate_daily_ops(
         base_capacity = float(rng.integers(220, 340))
 
         for d in dates:
-            demand = max(50.0, base_demand + rng.normal(0, 25))
-            capacity = max(50.0, base_capacity + rng.normal(0, 20))
-
-            processed = min(demand + queue, capacity)
-            queue = max(0.0, queue + demand - processed)
+            demand = max(MIN_DAILY_APPS, base_demand + rng.normal(0, 25))
+            capacity = max(MIN_DAILY_APPS, base_capacity + rng.normal(0, 20))
 
-            # simple TAT relationship: grows with queue
-            avg_tat = max(1.0, 3.0 + 0.015 * queue + rng.normal(0, 0.3))
+            processed, queue = step_queue(queue, demand, capacity)
+            avg_tat = tat_from_queue(queue, rng.normal(0, TAT_NOISE_SD))
 
             rows.append(
                 {
@@ -43,9 +70,9 @@ def generate_daily_ops(
                     "center": center,
                     "demand_apps": round(demand, 2),
                     "capacity_apps": round(capacity, 2),
-                    "processed_apps": round(processed, 2),
-                    "queue_size": round(queue, 2),
-                    "avg_tat_days": round(avg_tat, 2),
+                    "processed_apps": round(float(processed), 2),
+                    "queue_size": round(float(queue), 2),
+                    "avg_tat_days": round(float(avg_tat), 2),
                 }
             )
 
@@ -0,0 +1,278 @@
+"""
+Data-quality validation and calendar gap-filling for daily ops snapshots.
+
+`add_signals` assumes one clean row per center per day: its rolling windows
+count rows, not days, and `queue_delta` spans any gap. This stage runs
+before signal computation and, as whole-frame vectorized checks:
+
+- drops rows with a missing center or a missing / unparseable date
+- drops duplicate (center, date) keys, keeping the last report
+- blanks negative / non-finite values
+- clips processed_apps that exceed demand plus the previous day's queue
+- flags days with zero capacity or processed_apps above capacity
+- reindexes every center onto a complete daily calendar
+- fills gaps and blanked values with a configurable policy
+- returns a compact per-center quality report
+
+Reads:  data/processed/visaops_daily.csv
+Writes: data/processed/visaops_daily_quality.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_gen import DAILY_COLUMNS
+
+NUMERIC_FIELDS = DAILY_COLUMNS[2:]
+FILL_POLICIES = ("ffill", "interpolate", "none")
+
+REPORT_COLUMNS = [
+    "center",
+    "first_date",
+    "last_date",
+    "days",
+    "rows_in",
+    "invalid_dates",
+    "duplicates",
+    "invalid_values",
+    "processed_clipped",
+    "zero_capacity",
+    "over_capacity",
+    "missing_days",
+    "filled_values",
+]
+
+
+def _fill(values: np.ndarray, codes: np.ndarray, policy: str) -> np.ndarray:
+    """
+    Fill NaNs in a flat column without crossing center boundaries.
+    `codes` is the (sorted) center code of each row.
+    """
+    if policy == "none":
+        return values
+
+    n = len(values)
+    idx = np.arange(n)
+    valid = ~np.isnan(values)
+
+    prev = np.maximum.accumulate(np.where(valid, idx, -1))
+    nxt = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+    prev_ok = (prev >= 0) & (codes[np.maximum(prev, 0)] == codes)
+    next_ok = (nxt < n) & (codes[np.minimum(nxt, n - 1)] == codes)
+
+    prev_val = np.where(prev_ok, values[np.maximum(prev, 0)], np.nan)
+    next_val = np.where(next_ok, values[np.minimum(nxt, n - 1)], np.nan)
+
+    if policy == "interpolate":
+        span = (nxt - prev).astype(float)
+        frac = np.where(span > 0, (idx - prev) / np.where(span > 0, span, 1), 0.0)
+        both = prev_ok & next_ok
+        interp = prev_val + frac * (next_val - prev_val)
+        filled = np.where(both, interp, np.where(prev_ok, prev_val, next_val))
+    else:  # ffill, then back-fill leading gaps within the center
+        filled = np.where(prev_ok, prev_val, next_val)
+
+    return np.where(valid, values, filled)
+
+
+def validate_daily(
+    df: pd.DataFrame,
+    fill: str = "ffill",
+    tolerance: float = 0.01,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Clean `df` (daily schema) and put every center on a complete calendar.
+
+    fill:
+    - "ffill": carry the last valid value forward (leading gaps back-filled)
+    - "interpolate": linear between neighbouring valid days
+    - "none": leave gaps as NaN
+
+    Returns (clean, report): `clean` has the daily schema with one row per
+    center per day, sorted by center and date; `report` has one row per
+    center (see REPORT_COLUMNS).
+    """
+    if fill not in FILL_POLICIES:
+        raise ValueError(f"fill must be one of {FILL_POLICIES}, got '{fill}'")
+
+    missing = [c for c in DAILY_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing columns: {', '.join(missing)}")
+
+    # rows without a usable key cannot be placed on the calendar
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    keyed = (dates.notna() & df["center"].notna()).to_numpy()
+    dropped = df.loc[~keyed & df["center"].notna().to_numpy(), "center"].value_counts()
+    df, dates = df[keyed], dates[keyed]
+    if df.empty:
+        clean = df[DAILY_COLUMNS].assign(date=dates.astype("datetime64[ns]"))
+        return clean.reset_index(drop=True), pd.DataFrame(columns=REPORT_COLUMNS)
+
+    codes, centers = pd.factorize(df["center"], sort=True)
+    day = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    values = {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) for c in NUMERIC_FIELDS}
+    n_centers = len(centers)
+
+    # -------------------------------------------------
+    # Sort + duplicate keys (keep the last report)
+    # -------------------------------------------------
+
+    # single int64 sort key; a stable sort keeps report order within a key
+    key = (codes.astype(np.int64) << 32) | (day - day.min() if len(day) else day)
+    order = np.argsort(key, kind="stable")
+    codes, day = codes[order], day[order]
+    values = {c: v[order] for c, v in values.items()}
+
+    last_of_key = np.ones(len(codes), dtype=bool)
+    last_of_key[:-1] = (codes[1:] != codes[:-1]) | (day[1:] != day[:-1])
+    duplicates = np.bincount(codes[~last_of_key], minlength=n_centers)
+    rows_in = np.bincount(codes, minlength=n_centers)
+
+    codes, day = codes[last_of_key], day[last_of_key]
+    values = {c: v[last_of_key] for c, v in values.items()}
+
+    # -------------------------------------------------
+    # Negative / non-finite values
+    # -------------------------------------------------
+
+    invalid = np.zeros(n_centers, dtype=np.int64)
+    for c, v in values.items():
+        bad = ~np.isfinite(v) | (v < 0)
+        invalid += np.bincount(codes[bad], minlength=n_centers)
+        v[bad] = np.nan
+
+    # -------------------------------------------------
+    # Complete calendar per center
+    # -------------------------------------------------
+
+    # rows are sorted by (center, day), so each center's span is its first/last row
+    bounds = np.searchsorted(codes, np.arange(n_centers + 1))
+    first = day[bounds[:-1]]
+    last = day[bounds[1:] - 1]
+    days = last - first + 1
+    offsets = np.concatenate([[0], np.cumsum(days)[:-1]])
+
+    total = int(days.sum())
+    full_codes = np.repeat(np.arange(n_centers), days)
+    full_day = first[full_codes] + (np.arange(total) - offsets[full_codes])
+    pos = offsets[codes] + (day - first[codes])
+
+    missing_days = days - rows_in + duplicates
+
+    full = {}
+    for c, v in values.items():
+        col = np.full(total, np.nan)
+        col[pos] = v
+        full[c] = col
+
+    # -------------------------------------------------
+    # Processed cannot exceed demand + previous day's queue
+    # -------------------------------------------------
+
+    prev_queue = np.empty(total)
+    prev_queue[0] = np.nan
+    prev_queue[1:] = full["queue_size"][:-1]
+    prev_queue[offsets] = np.nan  # first day of each center: backlog unknown
+    supply = full["demand_apps"] + prev_queue
+    over = full["processed_apps"] > supply * (1 + tolerance) + tolerance
+    over &= ~np.isnan(supply)
+    full["processed_apps"] = np.where(over, supply, full["processed_apps"])
+    processed_clipped = np.bincount(full_codes[over], minlength=n_centers)
+
+    # -------------------------------------------------
+    # Capacity flags (reported, values left as is)
+    # -------------------------------------------------
+
+    # utilization = processed / capacity: undefined at zero, > 1 above capacity
+    zero_cap = full["capacity_apps"] == 0
+    over_cap = full["processed_apps"] > full["capacity_apps"] * (1 + tolerance) + tolerance
+    zero_capacity = np.bincount(full_codes[zero_cap], minlength=n_centers)
+    over_capacity = np.bincount(full_codes[over_cap & ~zero_cap], minlength=n_centers)
+
+    # -------------------------------------------------
+    # Fill policy
+    # -------------------------------------------------
+
+    filled_values = np.zeros(n_centers, dtype=np.int64)
+    for c in NUMERIC_FIELDS:
+        gaps = np.isnan(full[c])
+        full[c] = _fill(full[c], full_codes, fill)
+        now_filled = gaps & ~np.isnan(full[c])
+        filled_values += np.bincount(full_codes[now_filled], minlength=n_centers)
+
+    clean = pd.DataFrame(
+        {
+            "date": full_day.astype("datetime64[D]").astype("datetime64[ns]"),
+            "center": np.asarray(centers, dtype=object)[full_codes],
+            **full,
+        }
+    )[DAILY_COLUMNS]
+
+    invalid_dates = dropped.reindex(centers, fill_value=0).to_numpy()
+    report = pd.DataFrame(
+        {
+            "center": list(centers),
+            "first_date": first.astype("datetime64[D]"),
+            "last_date": last.astype("datetime64[D]"),
+            "days": days,
+            "rows_in": rows_in + invalid_dates,
+            "invalid_dates": invalid_dates,
+            "duplicates": duplicates,
+            "invalid_values": invalid,
+            "processed_clipped": processed_clipped,
+            "zero_capacity": zero_capacity,
+            "over_capacity": over_capacity,
+            "missing_days": missing_days,
+            "filled_values": filled_values,
+        }
+    )[REPORT_COLUMNS]
+
+    return clean, report
+
+
+def summarize_quality(report: pd.DataFrame) -> str:
+    """One-line network summary of a quality report."""
+    issues = report[
+        [
+            "invalid_dates",
+            "duplicates",
+            "invalid_values",
+            "processed_clipped",
+            "zero_capacity",
+            "over_capacity",
+            "missing_days",
+        ]
+    ].sum()
+    flagged = (report[issues.index].sum(axis=1) > 0).sum()
+    return (
+        f"{len(report)} centers, {flagged} with issues: "
+        + ", ".join(f"{k}={int(v)}" for k, v in issues.items())
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate and gap-fill daily ops snapshots.")
+    parser.add_argument("--input", default="data/processed/visaops_daily.csv", help="Daily CSV")
+    parser.add_argument("--report", default="data/processed/visaops_daily_quality.csv", help="Quality report CSV")
+    parser.add_argument("--fill", default="ffill", choices=FILL_POLICIES, help="Gap fill policy")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+
+    t0 = time.perf_counter()
+    clean, report = validate_daily(df, fill=args.fill)
+    elapsed = time.perf_counter() - t0
+
+    report.to_csv(args.report, index=False)
+    print(f"Validated {len(df)} rows in {elapsed:.3f}s ({len(df) / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(summarize_quality(report))
+    print(report.to_string(index=False, max_rows=20))
+
+
+if __name__ == "__main__":
+    main()
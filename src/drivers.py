@@ -0,0 +1,245 @@
+"""
+Driver attribution: what moved each center's stress over the last week.
+
+For every center at once, compares the mean of the last `window` days with
+the `window` days before and decomposes the change in `stress_index` into
+exact contributions from its weighted z-scored components:
+
+    stress_index = sum_c w_c * z_c,  z_c = (x_c - mean_c) / std_c
+    => delta stress = sum_c w_c * delta z_c = sum_c w_c * delta x_c / std_c
+
+mean_c and std_c are per-center constants. They are recovered from the
+(x_c, z_c) pairs in the table rather than recomputed, so the decomposition
+matches whatever history `add_signals` normalized over. Windows, means and
+z-score statistics are grouped bincount reductions over the whole table,
+so the network-wide table is one pass regardless of the number of centers.
+
+The tidy table (one row per center x metric) feeds the PDF report, the
+memo and the dashboard.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/stress_drivers.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from signals import STRESS_WEIGHTS
+
+# Operational metrics shown alongside the decomposition
+DRIVER_METRICS = {
+    "avg_tat_days": "Avg TAT (days)",
+    "queue_delta": "Queue velocity",
+    "utilization": "Utilization",
+}
+
+COMPONENT_LABELS = {
+    "utilization": "utilization",
+    "queue_vel_mean_7d": "queue velocity (7d mean)",
+    "tat_std_7d": "TAT volatility (7d std)",
+}
+
+DRIVER_COLUMNS = [
+    "center",
+    "kind",
+    "metric",
+    "label",
+    "last",
+    "prev",
+    "delta",
+    "weight",
+    "z_mean",
+    "z_std",
+    "contribution",
+]
+
+# |delta stress| below this is reported as flat
+FLAT_STRESS_DELTA = 0.05
+
+
+def driver_table(df: pd.DataFrame, window: int = 7) -> pd.DataFrame:
+    """
+    Tidy driver table for every center in `df` (signals schema).
+
+    kind:
+    - "metric": operational metric, last/prev window means and delta
+    - "component": stress-index term; last/prev/delta are of the raw
+      component, z_mean/z_std its z-score statistics, and contribution =
+      weight * delta of its z-score (= weight * delta / z_std)
+    - "stress": the stress index itself; contribution is its delta, equal
+      to the sum of the component contributions
+
+    Centers with fewer than 2 * window days get NaN for the prev window.
+    """
+    z_cols = [f"{c}_z" for c in STRESS_WEIGHTS]
+    cols = list(dict.fromkeys([*DRIVER_METRICS, *STRESS_WEIGHTS, *z_cols, "stress_index"]))
+    d = df[["center", "date", *cols]].sort_values(["center", "date"], kind="stable")
+
+    codes, centers = pd.factorize(d["center"], sort=True)
+    n_centers = len(centers)
+    n = len(codes)
+
+    # position from each center's latest day: 0 .. window-1 last, window .. 2*window-1 prev
+    bounds = np.searchsorted(codes, np.arange(n_centers + 1))
+    pos = bounds[codes + 1] - 1 - np.arange(n)
+    win = pos // window
+    sel = win < 2
+    bins = codes[sel] * 2 + win[sel]
+
+    counts = np.bincount(bins, minlength=2 * n_centers).reshape(n_centers, 2)
+    rows = np.bincount(codes, minlength=n_centers)
+
+    def window_means(x: np.ndarray) -> np.ndarray:
+        sums = np.bincount(bins, weights=x[sel], minlength=2 * n_centers).reshape(n_centers, 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts == window, sums / counts, np.nan)
+
+    def z_stats(x: np.ndarray, z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # x = mean + std * z within a center: per-center least squares
+        x_bar = np.bincount(codes, weights=x, minlength=n_centers) / rows
+        z_bar = np.bincount(codes, weights=z, minlength=n_centers) / rows
+        dz = z - z_bar[codes]
+        szz = np.bincount(codes, weights=dz * dz, minlength=n_centers)
+        sxz = np.bincount(codes, weights=dz * (x - x_bar[codes]), minlength=n_centers)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.where(szz > 0, sxz / szz, 1.0)  # constant component: std set to 1
+        return x_bar - std * z_bar, std
+
+    names = np.asarray(centers, dtype=object)
+    frames = []
+
+    def add(kind: str, metric: str, label: str, m: np.ndarray, **extra) -> None:
+        frames.append(
+            pd.DataFrame(
+                {
+                    "center": names,
+                    "kind": kind,
+                    "metric": metric,
+                    "label": label,
+                    "last": m[:, 0],
+                    "prev": m[:, 1],
+                    "delta": m[:, 0] - m[:, 1],
+                    **extra,
+                }
+            )
+        )
+
+    for col, label in DRIVER_METRICS.items():
+        add("metric", col, label, window_means(d[col].to_numpy(dtype=float)))
+
+    total = np.zeros(n_centers)
+    for col, w in STRESS_WEIGHTS.items():
+        x = d[col].to_numpy(dtype=float)
+        z = d[f"{col}_z"].to_numpy(dtype=float)
+        m = window_means(x)
+        zm = window_means(z)
+        mean, std = z_stats(x, z)
+        contrib = w * (zm[:, 0] - zm[:, 1])
+        total += contrib
+        add(
+            "component", col, COMPONENT_LABELS.get(col, col), m,
+            weight=w, z_mean=mean, z_std=std, contribution=contrib,
+        )
+
+    add("stress", "stress_index", "Stress index", window_means(d["stress_index"].to_numpy(dtype=float)))
+    frames[-1]["contribution"] = total
+
+    out = pd.concat(frames, ignore_index=True).reindex(columns=DRIVER_COLUMNS)
+    order = {"metric": 0, "component": 1, "stress": 2}
+    out["_k"] = out["kind"].map(order)
+    out = out.sort_values(["center", "_k"], kind="stable").drop(columns="_k")
+    return out.reset_index(drop=True)
+
+
+def driver_summary(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per center: stress delta, each component's contribution, the
+    dominant driver and a one-sentence explanation.
+    """
+    comp = table[table["kind"] == "component"].pivot(index="center", columns="metric", values="contribution")
+    comp = comp[[c for c in STRESS_WEIGHTS if c in comp.columns]]
+    stress = table[table["kind"] == "stress"].set_index("center")
+
+    out = pd.DataFrame(index=comp.index)
+    out["stress_last"] = stress["last"]
+    out["stress_prev"] = stress["prev"]
+    out["stress_delta"] = stress["delta"]
+    for c in comp.columns:
+        out[f"contrib_{c}"] = comp[c]
+
+    vals = comp.to_numpy()
+    valid = ~np.isnan(vals).all(axis=1)
+    top = np.argmax(np.abs(np.nan_to_num(vals)), axis=1)
+    top_val = vals[np.arange(len(vals)), top]
+    labels = np.asarray([COMPONENT_LABELS.get(c, c) for c in comp.columns], dtype=object)
+    out["dominant"] = np.where(valid, np.asarray(comp.columns, dtype=object)[top], None)
+
+    def fmt(v, spec: str = "{:+.2f}") -> pd.Series:
+        return pd.Series(v, index=out.index).map(spec.format)
+
+    delta = out["stress_delta"]
+    gross = np.nansum(np.abs(vals), axis=1)
+    share = np.divide(np.abs(top_val), gross, out=np.zeros(len(vals)), where=gross > 0) * 100
+    direction = pd.Series(np.where(delta > 0, "rose", "eased"), index=out.index)
+
+    moved = (
+        "Stress " + direction + " by " + fmt(delta.abs(), "{:.2f}") + ", driven mainly by "
+        + pd.Series(labels[top], index=out.index) + " (" + fmt(top_val) + ", "
+        + fmt(share, "{:.0f}") + "% of the gross component movement)."
+    )
+    flat = "Stress broadly flat (" + fmt(delta) + "); no dominant operational driver."
+
+    out["summary"] = np.where(
+        ~valid | delta.isna(),
+        "Not enough history for a week-over-week comparison.",
+        np.where(delta.abs() < FLAT_STRESS_DELTA, flat, moved),
+    )
+    return out.reset_index()
+
+
+def center_drivers(table: pd.DataFrame, center: str) -> pd.DataFrame:
+    """
+    Display view of one center's drivers: operational metrics in their own
+    units, then each stress term and the stress index in stress-index units
+    (weight * mean z-score), so the term deltas add up to the stress delta.
+    """
+    t = table[table["center"] == center]
+    comp = t["kind"] == "component"
+
+    view = pd.DataFrame({"Metric": t["label"], "Last 7d": t["last"], "Prev 7d": t["prev"], "Δ": t["delta"]})
+    for col in ("last", "prev"):
+        stress_units = t["weight"] * (t[col] - t["z_mean"]) / t["z_std"]
+        view.loc[comp, f"{col.title()} 7d"] = stress_units[comp]
+    view.loc[comp, "Δ"] = t.loc[comp, "contribution"]
+    view.loc[comp, "Metric"] = "Stress from " + t.loc[comp, "label"]
+    return view.reset_index(drop=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Week-over-week stress driver attribution for every center.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--output", default="data/processed/stress_drivers.csv", help="Tidy driver table CSV")
+    parser.add_argument("--window", type=int, default=7, help="Days per comparison window")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    df["date"] = pd.to_datetime(df["date"])
+
+    t0 = time.perf_counter()
+    table = driver_table(df, window=args.window)
+    summary = driver_summary(table)
+    elapsed = time.perf_counter() - t0
+
+    table.to_csv(args.output, index=False)
+    print(f"Driver attribution for {len(summary)} centers in {elapsed:.3f}s -> {args.output}")
+    top = summary.reindex(summary["stress_delta"].abs().sort_values(ascending=False).index)
+    print(top[["center", "stress_delta", "dominant", "summary"]].head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
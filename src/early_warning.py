@@ -4,10 +4,15 @@ Early-warning analysis for operational stress.
 Computes lead time between early stress signals and entry into
 the 'stressed' operational regime, across all centers, and prints
 a per-center summary of detection performance.
+
+`main` maintains the persistent episode catalogue (only rows after each
+center's watermark are scanned) and exports it to early_warning_episodes.csv.
 """
 
 import pandas as pd
 
+from episode_catalogue import EpisodeCatalogue
+
 
 def compute_lead_times(
     df: pd.DataFrame,
@@ -99,24 +104,22 @@ def main() -> None:
     df = pd.read_csv("data/processed/visaops_signals.csv")
     df["date"] = pd.to_datetime(df["date"])
 
-    all_centers = df["center"].unique().tolist()
-    all_results = []
-
-    for center in all_centers:
-        res = compute_lead_times(
-            df,
-            center=center,
-            stress_threshold=0.3,  # same threshold for all centers (baseline)
-        )
-        if not res.empty:
-            all_results.append(res)
-
-    if not all_results:
+    # same threshold for all centers (baseline)
+    # centers re-normalized since the catalogue's signals run are rescanned
+    catalogue = EpisodeCatalogue(stress_threshold=0.3)
+    scanned = catalogue.sync(df)
+    catalogue.save()
+    print(
+        f"Episode catalogue: scanned {scanned} rows, watermark {catalogue.watermark()}, "
+        f"signals run {catalogue.source_run}"
+    )
+
+    final = catalogue.lead_times()
+    if final.empty:
         print("No early-warning episodes detected for any center.")
         return
 
-    final = pd.concat(all_results, ignore_index=True)
-    final.to_csv("data/processed/early_warning_episodes.csv", index=False)
+    final.to_csv("data/processed/early_warning_episodes.csv", index=False, date_format="%Y-%m-%d")
 
     print("Early-warning episodes across centers")
     print(final.to_string(index=False))
@@ -0,0 +1,369 @@
+"""
+Persistent, incrementally refreshed catalogue of stressed episodes.
+
+Episodes follow `early_warning.compute_lead_times`: an episode starts when
+the regime switches into 'stressed', and its warning_start is the first
+day of the unbroken run of stress_index >= threshold just before it. The
+catalogue also records where each episode ends and its peak stress.
+
+Alongside the episodes it keeps one state row per center:
+- watermark: last processed date
+- in_episode: whether the center was stressed on the watermark day (the
+  center's last episode is then still open)
+- run_start: first day of the warning run still unbroken on the watermark
+  day (NaT if stress was below the threshold)
+
+A refresh only scans rows after each center's watermark, carrying that
+state across the boundary to extend or close open episodes and append new
+ones, so its cost scales with the new data rather than the full history.
+Rows on or before the watermark are treated as final.
+
+They are not final across pipeline runs: `add_signals` re-normalizes each
+center's whole history, so a run can rewrite stress and regimes before the
+watermark. The catalogue records the signal history run it was built from
+(`source_run`), and `sync` first drops the centers whose rows the history
+shows as rewritten since then (all of them if the source run is unknown),
+so those are rescanned from their first day.
+
+Reads:  data/processed/visaops_signals.csv, data/processed/signal_history/
+Writes: data/processed/episode_catalogue/episodes.csv,
+        data/processed/episode_catalogue/state.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from signal_history import SignalHistory
+
+CATALOGUE_DIR = Path("data/processed/episode_catalogue")
+
+EPISODE_COLUMNS = [
+    "center",
+    "stress_start",
+    "stress_end",
+    "warning_start",
+    "lead_time_days",
+    "duration_days",
+    "peak_stress",
+    "is_open",
+]
+STATE_COLUMNS = ["center", "watermark", "in_episode", "run_start", "stress_threshold", "source_run"]
+
+_DATE_COLUMNS = ("stress_start", "stress_end", "warning_start")
+
+
+def _empty_episodes() -> pd.DataFrame:
+    ep = pd.DataFrame({c: pd.Series(dtype=float) for c in EPISODE_COLUMNS})
+    ep["center"] = ep["center"].astype(object)
+    for c in _DATE_COLUMNS:
+        ep[c] = pd.Series(dtype="datetime64[ns]")
+    ep["is_open"] = ep["is_open"].astype(bool)
+    return ep
+
+
+def _empty_state() -> pd.DataFrame:
+    st = pd.DataFrame(columns=STATE_COLUMNS)
+    st["watermark"] = pd.Series(dtype="datetime64[ns]")
+    st["run_start"] = pd.Series(dtype="datetime64[ns]")
+    st["in_episode"] = st["in_episode"].astype(bool)
+    return st
+
+
+def scan_episodes(
+    new: pd.DataFrame,
+    state: pd.DataFrame,
+    stress_threshold: float = 0.3,
+    regime_label: str = "stressed",
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Scan rows past the watermark for every center at once.
+
+    `new` holds only unprocessed rows (date, center, stress_index, regime);
+    `state` holds the carried-over state of centers seen before. Returns
+    (segments, new_state). Each segment is one episode's stressed days
+    within `new`; `continues` marks segments that extend the center's open
+    episode instead of starting a new one.
+    """
+    d = new.sort_values(["center", "date"], kind="stable")
+    center = d["center"].to_numpy(dtype=object)
+    date = d["date"].to_numpy(dtype="datetime64[ns]")
+    stress = d["stress_index"].to_numpy(dtype=float)
+    stressed = d["regime"].to_numpy() == regime_label
+    above = stress >= stress_threshold
+    n = len(d)
+    idx = np.arange(n)
+
+    first = np.ones(n, dtype=bool)
+    first[1:] = center[1:] != center[:-1]
+    group_start = np.maximum.accumulate(np.where(first, idx, 0))
+
+    # carried-over state at each center's first new row
+    st = state.set_index("center").reindex(pd.unique(center))
+    carried_in = st["in_episode"].isin([True]).to_numpy()
+    carried_run = st["run_start"].to_numpy(dtype="datetime64[ns]")
+    gid = np.cumsum(first) - 1
+
+    def shifted(x: np.ndarray, carried: np.ndarray) -> np.ndarray:
+        out = np.empty_like(x)
+        out[1:] = x[:-1]
+        out[first] = carried
+        return out
+
+    prev_stressed = shifted(stressed, carried_in[gid[first]])
+    prev_above = shifted(above, ~np.isnat(carried_run[gid[first]]))
+
+    # first day of the warning run ending on each row (NaT when below threshold)
+    run_begin = above & ~prev_above
+    last_begin = np.maximum.accumulate(np.where(run_begin, idx, -1))
+    in_group = last_begin >= group_start
+    run_start = np.where(in_group, date[np.maximum(last_begin, 0)], carried_run[gid])
+    run_start = np.where(above, run_start, np.datetime64("NaT"))
+    prev_run_start = shifted(run_start, carried_run[gid[first]])
+
+    # episode segments: runs of stressed rows
+    seg_begin = stressed & (~prev_stressed | first)
+    seg_id = np.cumsum(seg_begin) - 1
+    rows = np.flatnonzero(stressed)
+    seg = seg_id[rows]
+
+    begin_rows = np.flatnonzero(seg_begin)
+    continues = first[begin_rows] & prev_stressed[begin_rows]
+    warning = prev_run_start[begin_rows]
+    end_rows = begin_rows + np.bincount(seg, minlength=len(begin_rows)) - 1
+
+    segments = pd.DataFrame(
+        {
+            "center": center[begin_rows],
+            "stress_start": date[begin_rows],
+            "stress_end": date[end_rows],
+            "warning_start": np.where(continues, np.datetime64("NaT"), warning),
+            "days": end_rows - begin_rows + 1,
+            "peak_stress": np.maximum.reduceat(stress[rows], np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]]))
+            if len(rows) else np.empty(0),
+            "continues": continues,
+        }
+    )
+
+    last = np.r_[first[1:], True]
+    new_state = pd.DataFrame(
+        {
+            "center": center[last],
+            "watermark": date[last],
+            "in_episode": stressed[last],
+            "run_start": run_start[last],
+            "stress_threshold": stress_threshold,
+        }
+    )
+    return segments, new_state
+
+
+class EpisodeCatalogue:
+    """Episodes + per-center watermark state, stored as two CSVs."""
+
+    def __init__(self, root: str | Path = CATALOGUE_DIR, stress_threshold: float = 0.3):
+        self.root = Path(root)
+        self.stress_threshold = stress_threshold
+        self.episodes = _empty_episodes()
+        self.state = _empty_state()
+        # signal history run the catalogue reflects (None: unknown)
+        self.source_run: int | None = None
+
+        ep_path, st_path = self.root / "episodes.csv", self.root / "state.csv"
+        if ep_path.exists() and st_path.exists():
+            state = pd.read_csv(st_path, parse_dates=["watermark", "run_start"])
+            # a different threshold invalidates every warning run: start over
+            if state.empty or np.allclose(state["stress_threshold"], stress_threshold):
+                self.episodes = pd.read_csv(ep_path, parse_dates=list(_DATE_COLUMNS))
+                self.state = state.drop(columns="source_run", errors="ignore")
+                if "source_run" in state and state["source_run"].notna().any():
+                    self.source_run = int(state["source_run"].max())
+        self._index()
+
+    def _index(self) -> None:
+        self.episodes = self.episodes.sort_values(["center", "stress_start"]).reset_index(drop=True)
+        names = self.episodes["center"].to_numpy(dtype=object)
+        self._centers, first = np.unique(names, return_index=True)
+        self._bounds = np.r_[first, len(names)]
+
+    def watermark(self, center: str | None = None) -> pd.Timestamp | None:
+        """Last processed date for `center` (or the earliest over all centers)."""
+        st = self.state if center is None else self.state[self.state["center"] == center]
+        return None if st.empty else st["watermark"].min()
+
+    def refresh(self, df: pd.DataFrame, regime_label: str = "stressed") -> int:
+        """
+        Process rows of `df` (signals) after each center's watermark.
+        Returns the number of rows scanned.
+        """
+        d = df[["date", "center", "stress_index", "regime"]].copy()
+        d["date"] = pd.to_datetime(d["date"])
+
+        marks = self.state.set_index("center")["watermark"]
+        cutoff = marks.reindex(d["center"]).to_numpy(dtype="datetime64[ns]")
+        new = d[np.isnat(cutoff) | (d["date"].to_numpy() > cutoff)]
+        if new.empty:
+            return 0
+
+        segments, new_state = scan_episodes(new, self.state, self.stress_threshold, regime_label)
+
+        ep = self.episodes
+        open_idx = ep.index[ep["is_open"]]
+        ep.loc[open_idx, "is_open"] = False
+
+        # extend open episodes with their continuation segment
+        cont = segments[segments["continues"]].set_index("center")
+        if not cont.empty:
+            rows = open_idx[ep.loc[open_idx, "center"].isin(cont.index)]
+            c = cont.loc[ep.loc[rows, "center"]]
+            ep.loc[rows, "stress_end"] = c["stress_end"].to_numpy()
+            ep.loc[rows, "duration_days"] = ep.loc[rows, "duration_days"].to_numpy() + c["days"].to_numpy()
+            ep.loc[rows, "peak_stress"] = np.maximum(ep.loc[rows, "peak_stress"].to_numpy(), c["peak_stress"].to_numpy())
+
+        # centers with no new rows keep their open episode open
+        untouched = ~ep.loc[open_idx, "center"].isin(new_state["center"])
+        ep.loc[open_idx[untouched.to_numpy()], "is_open"] = True
+
+        fresh = segments[~segments["continues"]]
+        added = pd.DataFrame(
+            {
+                "center": fresh["center"],
+                "stress_start": fresh["stress_start"],
+                "stress_end": fresh["stress_end"],
+                "warning_start": fresh["warning_start"],
+                "lead_time_days": (fresh["stress_start"] - fresh["warning_start"]).dt.days,
+                "duration_days": fresh["days"],
+                "peak_stress": fresh["peak_stress"],
+                "is_open": False,
+            }
+        )
+        ep = pd.concat([ep, added], ignore_index=True) if len(ep) else added.reset_index(drop=True)
+
+        self.state = pd.concat(
+            [self.state[~self.state["center"].isin(new_state["center"])], new_state],
+            ignore_index=True,
+        ).sort_values("center").reset_index(drop=True)
+
+        # the last episode of a center that is still stressed on its watermark is open
+        self.episodes = ep
+        self._index()
+        still_open = self.state.loc[self.state["in_episode"].astype(bool), "center"]
+        last_rows = self.episodes.groupby("center").tail(1)
+        self.episodes.loc[last_rows.index[last_rows["center"].isin(still_open)], "is_open"] = True
+        return len(new)
+
+    def rebuild(self, df: pd.DataFrame, regime_label: str = "stressed") -> int:
+        """Drop all state and re-scan `df` from the start."""
+        self.episodes = _empty_episodes()
+        self.state = _empty_state()
+        return self.refresh(df, regime_label)
+
+    def forget(self, centers) -> None:
+        """Drop the episodes and state of `centers` (rescanned in full on the next refresh)."""
+        self.episodes = self.episodes[~self.episodes["center"].isin(centers)]
+        self.state = self.state[~self.state["center"].isin(centers)].reset_index(drop=True)
+        self._index()
+
+    def sync(
+        self,
+        df: pd.DataFrame,
+        history: SignalHistory | None = None,
+        regime_label: str = "stressed",
+    ) -> int:
+        """
+        Refresh from `df`, the signals published by the latest run of
+        `history`. Centers rewritten since `source_run` are rescanned from
+        the start; an unknown (or newer) source run rebuilds everything.
+        Returns the number of rows scanned.
+        """
+        history = history if history is not None else SignalHistory()
+        run = history.latest_run
+        if run is None or self.source_run is None or self.source_run > run:
+            scanned = self.rebuild(df, regime_label)
+        else:
+            if run != self.source_run:
+                self.forget(history.changed_centers(self.source_run))
+            scanned = self.refresh(df, regime_label)
+        self.source_run = run
+        return scanned
+
+    def save(self) -> None:
+        """Write both files via temp files + os.replace."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        state = self.state.assign(source_run=self.source_run)
+        for name, frame in (("episodes.csv", self.episodes[EPISODE_COLUMNS]), ("state.csv", state[STATE_COLUMNS])):
+            tmp = self.root / f".{name}.tmp"
+            frame.to_csv(tmp, index=False, date_format="%Y-%m-%d")
+            os.replace(tmp, self.root / name)
+
+    def lookup(
+        self,
+        center: str | None = None,
+        start: str | pd.Timestamp | None = None,
+        end: str | pd.Timestamp | None = None,
+    ) -> pd.DataFrame:
+        """
+        Episodes of `center` (or all centers) overlapping [start, end].
+        Episodes are kept sorted by (center, stress_start), so a center is a
+        contiguous slice and the end bound is a binary search.
+        """
+        ep = self.episodes
+        if center is not None:
+            i = np.searchsorted(self._centers, center)
+            if i >= len(self._centers) or self._centers[i] != center:
+                return ep.iloc[:0]
+            ep = ep.iloc[self._bounds[i] : self._bounds[i + 1]]
+
+        if end is not None:
+            end = pd.Timestamp(end)
+            if center is not None:
+                ep = ep.iloc[: np.searchsorted(ep["stress_start"].to_numpy(), end.to_datetime64(), side="right")]
+            else:
+                ep = ep[ep["stress_start"] <= end]
+        if start is not None:
+            ep = ep[ep["stress_end"] >= pd.Timestamp(start)]
+        return ep
+
+    def lead_times(self) -> pd.DataFrame:
+        """Episodes in the `early_warning_episodes.csv` layout."""
+        return self.episodes[["center", "stress_start", "warning_start", "lead_time_days"]].copy()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh the persistent episode catalogue.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--root", default=str(CATALOGUE_DIR), help="Catalogue directory")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Warning threshold on stress_index")
+    parser.add_argument("--history", default=None, help="Signal history the input was published from (default: data/processed/signal_history)")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore watermarks and rescan everything")
+    parser.add_argument("--center", default=None, help="Print episodes for this center")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    cat = EpisodeCatalogue(args.root, stress_threshold=args.threshold)
+
+    t0 = time.perf_counter()
+    history = SignalHistory(args.history) if args.history else SignalHistory()
+    if args.rebuild:
+        cat.source_run = None
+    scanned = cat.sync(df, history)
+    cat.save()
+    elapsed = time.perf_counter() - t0
+
+    print(
+        f"Scanned {scanned} new rows in {elapsed:.3f}s; catalogue holds "
+        f"{len(cat.episodes)} episodes ({int(cat.episodes['is_open'].sum())} open) "
+        f"for {len(cat.state)} centers, watermark {cat.watermark()}, signals run {cat.source_run}"
+    )
+    if args.center:
+        print(cat.lookup(args.center).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+Stress-regime forecasting across all centers.
+
+Fits a per-center VAR(1) on the stress index together with its queue and
+TAT components, then simulates forward paths to estimate the probability
+of entering the 'stressed' regime 1-14 days ahead. Fitting and simulation
+are batched matrix operations over every center at once (no per-center
+Python loop), so the whole network is forecast in a single pass.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/stress_forecast.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from early_warning import compute_lead_times
+from signals import STRESSED_THRESHOLD
+
+# Modeled jointly; the stress index must stay first (it drives the regime).
+FORECAST_COLUMNS = ("stress_index", "queue_vel_mean_7d_z", "tat_std_7d_z")
+
+
+# -------------------------------------------------
+# Panel construction
+# -------------------------------------------------
+
+def to_panel(
+    df: pd.DataFrame,
+    columns: tuple[str, ...] = FORECAST_COLUMNS,
+) -> tuple[np.ndarray, list[str], pd.DatetimeIndex]:
+    """
+    Pivot long signals into a (centers, dates, features) array.
+    Days missing for a center are NaN.
+    """
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"])
+    wide = d.pivot(index="center", columns="date", values=list(columns))
+
+    centers = wide.index.tolist()
+    dates = pd.DatetimeIndex(wide.columns.get_level_values(1).unique())
+    panel = (
+        wide.to_numpy(dtype=float)
+        .reshape(len(centers), len(columns), len(dates))
+        .transpose(0, 2, 1)
+    )
+    return panel, centers, dates
+
+
+def last_valid_state(panel: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Latest fully observed feature vector per center and its date index.
+    Centers with no observation get index -1 and a NaN state.
+    """
+    valid = np.isfinite(panel).all(axis=2)
+    n_dates = panel.shape[1]
+    last_idx = n_dates - 1 - np.argmax(valid[:, ::-1], axis=1)
+    last_idx = np.where(valid.any(axis=1), last_idx, -1)
+
+    state = panel[np.arange(panel.shape[0]), np.clip(last_idx, 0, None)]
+    state[last_idx < 0] = np.nan
+    return state, last_idx
+
+
+# -------------------------------------------------
+# Batched VAR(1)
+# -------------------------------------------------
+
+def fit_var1(
+    panel: np.ndarray,
+    ridge: float = 1e-3,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Least-squares VAR(1) with intercept for every center at once:
+
+        x[t+1] = x[t] @ A_c + b_c + e,   e ~ N(0, Sigma_c)
+
+    Transitions with a missing endpoint are dropped. A small ridge term keeps
+    the normal equations well-posed for short or flat histories.
+
+    Returns:
+    - coef:  (centers, k + 1, k) stacked [A_c; b_c]
+    - cov:   (centers, k, k) residual covariance
+    - n_obs: (centers,) transitions used in each fit
+    """
+    n_centers, _, k = panel.shape
+
+    x = panel[:, :-1, :]
+    y = panel[:, 1:, :]
+    valid = np.isfinite(x).all(axis=2) & np.isfinite(y).all(axis=2)
+
+    xa = np.concatenate([x, np.ones(x.shape[:2] + (1,))], axis=2)
+    xa = np.where(valid[..., None], xa, 0.0)
+    y = np.where(valid[..., None], y, 0.0)
+
+    xtx = np.einsum("ctp,ctq->cpq", xa, xa) + ridge * np.eye(k + 1)
+    xty = np.einsum("ctp,ctq->cpq", xa, y)
+    coef = np.linalg.solve(xtx, xty)
+
+    resid = np.where(valid[..., None], y - xa @ coef, 0.0)
+    n_obs = valid.sum(axis=1)
+    dof = np.maximum(n_obs - (k + 1), 1)
+    cov = np.einsum("ctp,ctq->cpq", resid, resid) / dof[:, None, None]
+
+    return coef, cov, n_obs
+
+
+def simulate_paths(
+    coef: np.ndarray,
+    cov: np.ndarray,
+    state: np.ndarray,
+    horizon: int = 14,
+    n_paths: int = 1000,
+    seed: int = 42,
+) -> np.ndarray:
+    """
+    Simulate VAR(1) paths for all centers in parallel.
+
+    Returns the stress index (feature 0) as a (centers, n_paths, horizon)
+    array.
+    """
+    rng = np.random.default_rng(seed)
+    n_centers, k = state.shape
+
+    a = coef[:, :k, :]
+    b = coef[:, k, :][:, None, :]
+    chol = np.linalg.cholesky(cov + 1e-9 * np.eye(k))
+
+    x = np.broadcast_to(state[:, None, :], (n_centers, n_paths, k))
+    out = np.empty((n_centers, n_paths, horizon))
+
+    for h in range(horizon):
+        shocks = rng.standard_normal((n_centers, n_paths, k)) @ chol.transpose(0, 2, 1)
+        x = x @ a + b + shocks
+        out[:, :, h] = x[:, :, 0]
+
+    return out
+
+
+def entry_probabilities(
+    paths: np.ndarray,
+    current_stress: np.ndarray,
+    threshold: float = STRESSED_THRESHOLD,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    From simulated stress paths (centers, n_paths, horizon) compute:
+    - p_stressed: probability of being in the stressed regime on day h
+    - p_enter_by: probability of a new stressed episode starting by day h
+
+    An episode starts when the regime switches into 'stressed', matching
+    `early_warning.compute_lead_times`; a center that is already stressed
+    must first leave the regime before it can enter again.
+    """
+    stressed = paths >= threshold
+    prev = np.concatenate(
+        [
+            np.broadcast_to(
+                (current_stress >= threshold)[:, None, None],
+                stressed.shape[:2] + (1,),
+            ),
+            stressed[:, :, :-1],
+        ],
+        axis=2,
+    )
+    entered = np.logical_or.accumulate(stressed & ~prev, axis=2)
+
+    return stressed.mean(axis=1), entered.mean(axis=1)
+
+
+# -------------------------------------------------
+# Forecast
+# -------------------------------------------------
+
+def forecast_stress(
+    df: pd.DataFrame,
+    horizon: int = 14,
+    n_paths: int = 1000,
+    min_obs: int = 10,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    Forecast every center from its latest observation.
+
+    Returns one row per (center, horizon day) with the mean simulated stress
+    index, the probability of being stressed that day and the probability of
+    entering the stressed regime by that day. Centers with fewer than
+    `min_obs` usable transitions get NaN probabilities.
+    """
+    panel, centers, dates = to_panel(df)
+    coef, cov, n_obs = fit_var1(panel)
+    state, last_idx = last_valid_state(panel)
+
+    ok = (n_obs >= min_obs) & (last_idx >= 0)
+    paths = simulate_paths(
+        coef[ok], cov[ok], state[ok], horizon=horizon, n_paths=n_paths, seed=seed
+    )
+    p_stressed, p_enter = entry_probabilities(paths, state[ok, 0])
+
+    full = np.full((len(centers), horizon), np.nan)
+    stress_mean, p_stressed_all, p_enter_all = full.copy(), full.copy(), full.copy()
+    stress_mean[ok] = paths.mean(axis=1)
+    p_stressed_all[ok] = p_stressed
+    p_enter_all[ok] = p_enter
+
+    origin = dates[np.clip(last_idx, 0, None)].to_numpy()
+    steps = np.arange(1, horizon + 1)
+
+    return pd.DataFrame(
+        {
+            "center": np.repeat(centers, horizon),
+            "origin_date": np.repeat(origin, horizon),
+            "horizon_days": np.tile(steps, len(centers)),
+            "forecast_date": np.repeat(origin, horizon)
+            + np.tile(steps, len(centers)).astype("timedelta64[D]"),
+            "stress_mean": stress_mean.ravel(),
+            "p_stressed": p_stressed_all.ravel(),
+            "p_enter_by": p_enter_all.ravel(),
+        }
+    )
+
+
+# -------------------------------------------------
+# Walk-forward backtest
+# -------------------------------------------------
+
+def episode_onsets(
+    df: pd.DataFrame,
+    centers: list[str],
+    dates: pd.DatetimeIndex,
+    episodes: pd.DataFrame | None = None,
+) -> np.ndarray:
+    """
+    (centers, dates) boolean matrix of stressed-episode start days, using the
+    episode definition from `early_warning.compute_lead_times`.
+
+    Pass `episodes` (e.g. early_warning_episodes.csv) to skip recomputing them.
+    """
+    if episodes is None:
+        found = [
+            compute_lead_times(g, center=center) for center, g in df.groupby("center")
+        ]
+        found = [e for e in found if not e.empty]
+        episodes = pd.concat(found, ignore_index=True) if found else pd.DataFrame(
+            columns=["center", "stress_start"]
+        )
+
+    onsets = np.zeros((len(centers), len(dates)), dtype=bool)
+    rows = pd.Index(centers).get_indexer(episodes["center"])
+    cols = dates.get_indexer(pd.to_datetime(episodes["stress_start"]))
+    keep = (rows >= 0) & (cols >= 0)
+    onsets[rows[keep], cols[keep]] = True
+    return onsets
+
+
+def walk_forward_backtest(
+    df: pd.DataFrame,
+    horizon: int = 14,
+    min_train_days: int | None = None,
+    step: int = 7,
+    n_paths: int = 500,
+    seed: int = 42,
+    episodes: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """
+    Refit on an expanding window every `step` days and score the predicted
+    entry probabilities against realized episode starts.
+
+    Each origin refits every center in one batched call. Only horizons that
+    are fully observed in the data are scored. Note that the input z-scores
+    are normalized with full-history statistics (as in `add_signals`), so
+    the backtest is optimistic about the stress level, not its timing.
+
+    `min_train_days` defaults to min(30, half the history), so short
+    histories still get forecast origins.
+
+    Returns one row per (origin, center, horizon day) with `p_enter_by` and
+    the realized `entered` flag (empty if the history has no origin).
+    """
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"])
+    panel, centers, dates = to_panel(d)
+    if min_train_days is None:
+        min_train_days = min(30, len(dates) // 2)
+    onsets = episode_onsets(d, centers, dates, episodes=episodes)
+    cum_onsets = np.cumsum(onsets, axis=1)
+
+    frames = []
+    for origin in range(min_train_days - 1, len(dates) - 1, step):
+        train = panel[:, : origin + 1]
+        coef, cov, n_obs = fit_var1(train)
+        state = train[:, -1, :]
+        ok = np.isfinite(state).all(axis=1) & (n_obs >= 10)
+        if not ok.any():
+            continue
+
+        paths = simulate_paths(
+            coef[ok], cov[ok], state[ok], horizon=horizon, n_paths=n_paths, seed=seed + origin
+        )
+        _, p_enter = entry_probabilities(paths, state[ok, 0])
+
+        steps = np.arange(1, min(horizon, len(dates) - 1 - origin) + 1)
+        entered = (cum_onsets[ok][:, origin + steps] - cum_onsets[ok][:, [origin]]) > 0
+        n_ok = int(ok.sum())
+
+        frames.append(
+            pd.DataFrame(
+                {
+                    "origin_date": dates[origin],
+                    "center": np.repeat(np.asarray(centers)[ok], len(steps)),
+                    "horizon_days": np.tile(steps, n_ok),
+                    "p_enter_by": p_enter[:, : len(steps)].ravel(),
+                    "entered": entered.ravel(),
+                }
+            )
+        )
+
+    if not frames:
+        return pd.DataFrame(columns=["origin_date", "center", "horizon_days", "p_enter_by", "entered"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize_backtest(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-horizon skill summary:
+    - forecasts: number of scored (origin, center) pairs
+    - base_rate: observed frequency of entering the stressed regime
+    - mean_p: mean forecast probability
+    - brier: Brier score of p_enter_by
+    - brier_climatology: Brier score of always forecasting the base rate
+    """
+    r = results.assign(
+        sq_err=(results["p_enter_by"] - results["entered"]) ** 2,
+    )
+    summary = r.groupby("horizon_days").agg(
+        forecasts=("entered", "size"),
+        base_rate=("entered", "mean"),
+        mean_p=("p_enter_by", "mean"),
+        brier=("sq_err", "mean"),
+    )
+    summary["brier_climatology"] = summary["base_rate"] * (1 - summary["base_rate"])
+    return summary.round(4).reset_index()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Forecast stress-regime entry for all centers.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--output", default="data/processed/stress_forecast.csv", help="Output forecast CSV")
+    parser.add_argument("--horizon", type=int, default=14, help="Forecast horizon in days")
+    parser.add_argument("--paths", type=int, default=1000, help="Simulated paths per center")
+    parser.add_argument("--backtest", action="store_true", help="Also run the walk-forward backtest")
+    parser.add_argument("--min-train-days", type=int, default=None, help="First backtest origin (default: min(30, half the history))")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    df["date"] = pd.to_datetime(df["date"])
+
+    t0 = time.perf_counter()
+    fc = forecast_stress(df, horizon=args.horizon, n_paths=args.paths)
+    elapsed = time.perf_counter() - t0
+
+    fc.to_csv(args.output, index=False)
+    print(f"Forecast {fc['center'].nunique()} centers in {elapsed:.2f}s -> {args.output}")
+
+    show = fc[fc["horizon_days"].isin([1, 7, args.horizon])]
+    print(
+        show.pivot(index="center", columns="horizon_days", values="p_enter_by")
+        .add_prefix("p_enter_by_")
+        .round(3)
+        .to_string()
+    )
+
+    if args.backtest:
+        results = walk_forward_backtest(df, horizon=args.horizon, min_train_days=args.min_train_days)
+        if results.empty:
+            n_days = df["date"].nunique()
+            print(f"\nWalk-forward backtest: no forecast origins in {n_days} days of history "
+                  f"(min_train_days={args.min_train_days}); nothing to score.")
+        else:
+            print("\nWalk-forward backtest (by horizon)")
+            print(summarize_backtest(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,599 @@
+"""
+Asyncio ingestion of per-center daily snapshots.
+
+Each center reports one row per day in the daily schema
+(`data_gen.DAILY_COLUMNS`), either as
+- a file drop (CSV, JSON or JSON Lines) in a watched directory, or
+- an HTTP POST of JSON (one record or a list) / CSV to a local endpoint.
+
+Payloads are parsed and validated concurrently, collected into batches,
+appended to the daily store with one bulk write per batch, and signals are
+then recomputed only for the centers that changed. The service keeps both
+tables in memory (`IngestStore`), so a flush does not re-read them, and it
+compacts the daily CSV once superseded reports pile up. A batch whose write
+fails is saved under data/processed/ingest_dead_letter/ as JSON Lines (drop
+it back into the watched directory to replay it). A stand-in feeder
+simulates thousands of centers reporting at once for load testing.
+
+Reads/Writes: data/processed/visaops_daily.csv, data/processed/visaops_signals.csv
+
+Usage:
+    python src/ingest.py serve --drop-dir data/incoming --port 8765
+    python src/ingest.py feed --centers 5000 --url http://127.0.0.1:8765/ingest
+    python src/ingest.py feed --centers 5000 --drop-dir data/incoming
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import math
+import os
+import time
+from datetime import date as date_cls
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from data_gen import DAILY_COLUMNS
+from data_quality import validate_daily
+from rollups import replace_rollups
+from signal_history import record_run
+from signal_store import publish
+from signals import add_signals
+
+NUMERIC_FIELDS = DAILY_COLUMNS[2:]
+DROP_SUFFIXES = {".csv": "csv", ".json": "json", ".jsonl": "jsonl"}
+
+
+# -------------------------------------------------
+# Parsing + validation
+# -------------------------------------------------
+
+def parse_record(raw: dict) -> dict:
+    """Validate one snapshot and normalize it to the daily schema."""
+    missing = [c for c in DAILY_COLUMNS if c not in raw]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+
+    center = str(raw["center"]).strip()
+    if not center:
+        raise ValueError("center is empty")
+
+    rec = {
+        "date": date_cls.fromisoformat(str(raw["date"])[:10]).isoformat(),
+        "center": center,
+    }
+    for col in NUMERIC_FIELDS:
+        value = float(raw[col])
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{col} must be a non-negative number")
+        rec[col] = value
+    return rec
+
+
+def parse_payload(data: bytes | str, fmt: str) -> tuple[list[dict], list[str]]:
+    """
+    Parse a CSV / JSON / JSON Lines payload into validated records.
+    Invalid records are reported in `errors`; a malformed payload raises
+    ValueError.
+    """
+    text = data.decode("utf-8") if isinstance(data, bytes) else data
+
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif fmt == "jsonl":
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        obj = json.loads(text)
+        rows = obj if isinstance(obj, list) else [obj]
+
+    records, errors = [], []
+    for i, raw in enumerate(rows):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("record must be an object")
+            records.append(parse_record(raw))
+        except (ValueError, TypeError) as e:
+            errors.append(f"record {i}: {e}")
+    return records, errors
+
+
+# -------------------------------------------------
+# Store updates
+# -------------------------------------------------
+
+def _csv_chunks(frame: pd.DataFrame, lines: list[str]) -> dict[str, str] | None:
+    """
+    Split CSV body `lines` (one per row of `frame`, same order) into one
+    text chunk per center. None if the lines do not line up with the rows
+    or a center's rows are not contiguous.
+    """
+    if len(lines) != len(frame):
+        return None
+    centers = frame["center"].astype(str).to_numpy()
+    if not len(centers):
+        return {}
+    starts = np.concatenate([[0], np.flatnonzero(centers[1:] != centers[:-1]) + 1])
+    if len(starts) != len(set(centers[starts])):
+        return None
+    ends = np.append(starts[1:], len(centers))
+    return {centers[a]: "".join(lines[a:b]) for a, b in zip(starts, ends)}
+
+
+class IngestStore:
+    """
+    Daily and signals tables of a running service, kept in memory between
+    flushes so a flush does not re-read either CSV.
+
+    A flush recomputes signals for the changed centers only. The signals CSV
+    is held as one formatted text chunk per center, so only those centers
+    are formatted again and the file is rewritten by concatenating chunks.
+    What still grows with the total history on every flush is that write
+    (plain I/O), publishing the memory-mapped store and rewriting the rollup
+    CSVs. The daily CSV is append-only between compactions: once superseded
+    reports (same center and date) make up `compact_ratio` of its rows, it is
+    rewritten with the latest report per (center, date).
+
+    A table is re-read when its file changed on disk since this store last
+    wrote it (e.g. a full `signals.py` run while the service is up).
+    """
+
+    def __init__(self, daily_path: Path, signals_path: Path, compact_ratio: float = 0.25):
+        self.daily_path = daily_path
+        self.signals_path = signals_path
+        self.compact_ratio = compact_ratio
+        self.daily: pd.DataFrame | None = None
+        self.signals: pd.DataFrame | None = None
+        self._header = ""
+        self._chunks: dict[str, str] = {}
+        self._mtimes: dict[Path, int | None] = {}
+
+    def _changed_on_disk(self, path: Path) -> bool:
+        mtime = path.stat().st_mtime_ns if path.exists() else None
+        return self._mtimes.get(path, -1) != mtime
+
+    def _written(self, path: Path) -> None:
+        self._mtimes[path] = path.stat().st_mtime_ns
+
+    def _load_daily(self) -> None:
+        if self.daily_path.exists():
+            self.daily = pd.read_csv(self.daily_path, dtype={"date": str, "center": str})
+        else:
+            self.daily = pd.DataFrame(columns=DAILY_COLUMNS)
+        self._mtimes[self.daily_path] = self.daily_path.stat().st_mtime_ns if self.daily_path.exists() else None
+
+    def _load_signals(self) -> None:
+        self._header, self._chunks = "", {}
+        self.signals = None
+        if self.signals_path.exists():
+            text = self.signals_path.read_text()
+            self.signals = pd.read_csv(io.StringIO(text), dtype={"date": str, "center": str})
+            lines = text.splitlines(keepends=True)
+            self._header = lines[0] if lines else ""
+            chunks = _csv_chunks(self.signals, lines[1:])
+            if chunks is None:  # not laid out by center: format once from the frame
+                self.signals = self.signals.sort_values(["center", "date"]).reset_index(drop=True)
+                chunks = self._format(self.signals)
+            self._chunks = chunks
+        self._mtimes[self.signals_path] = self.signals_path.stat().st_mtime_ns if self.signals_path.exists() else None
+
+    def _format(self, frame: pd.DataFrame) -> dict[str, str]:
+        """Per-center CSV chunks for `frame` (sorted by center), in one `to_csv` call."""
+        text = frame.to_csv(index=False, header=False, lineterminator="\n")
+        chunks = _csv_chunks(frame, text.splitlines(keepends=True))
+        if chunks is None:  # a value spans lines: fall back to one call per center
+            chunks = {
+                c: g.to_csv(index=False, header=False, lineterminator="\n")
+                for c, g in frame.groupby("center", sort=False)
+            }
+        return chunks
+
+    def append(self, records: list[dict]) -> set[str]:
+        """Append a batch to the daily store in one write; returns changed centers."""
+        if self.daily is None or self._changed_on_disk(self.daily_path):
+            self._load_daily()
+
+        batch = pd.DataFrame(records, columns=DAILY_COLUMNS)
+        self.daily_path.parent.mkdir(parents=True, exist_ok=True)
+        batch.to_csv(self.daily_path, mode="a", header=not self.daily_path.exists(), index=False)
+        self._written(self.daily_path)
+        self.daily = pd.concat([self.daily, batch], ignore_index=True)
+
+        superseded = int(self.daily.duplicated(["center", "date"], keep="last").sum())
+        if superseded and superseded >= self.compact_ratio * len(self.daily):
+            self.compact()
+        return set(batch["center"])
+
+    def compact(self) -> None:
+        """Rewrite the daily CSV with only the latest report per (center, date)."""
+        self.daily = self.daily.drop_duplicates(["center", "date"], keep="last").reset_index(drop=True)
+        tmp = self.daily_path.with_suffix(".tmp")
+        self.daily.to_csv(tmp, index=False)
+        os.replace(tmp, self.daily_path)
+        self._written(self.daily_path)
+
+    def refresh(self, centers: set[str]) -> int:
+        """
+        Recompute signals for `centers` only and splice them into the signals
+        file (written to a temp file and swapped in), the memory-mapped store,
+        the signal history and the weekly / monthly rollups. Stress z-scores
+        are per-center, so other centers are unaffected; the changed centers'
+        whole history can move, so all of their rollup periods are rebuilt.
+        Rows go through `validate_daily` first, so later reports for the same
+        (center, date) replace earlier ones and missing days are filled.
+        """
+        if self.daily is None or self._changed_on_disk(self.daily_path):
+            self._load_daily()
+        if self.signals is None or self._changed_on_disk(self.signals_path):
+            self._load_signals()
+
+        d, _ = validate_daily(self.daily[self.daily["center"].isin(centers)])
+        fresh = add_signals(d)
+        fresh["date"] = fresh["date"].dt.strftime("%Y-%m-%d")
+
+        if self.signals is not None and list(self.signals.columns) == list(fresh.columns):
+            fresh = pd.concat([self.signals[~self.signals["center"].isin(centers)], fresh], ignore_index=True)
+            fresh = fresh.sort_values(["center", "date"]).reset_index(drop=True)
+            changed = fresh[fresh["center"].isin(centers)]
+            self._chunks = {c: t for c, t in self._chunks.items() if c not in centers}
+            self._chunks.update(self._format(changed))
+        else:  # first run or new columns: format everything
+            fresh = fresh.sort_values(["center", "date"]).reset_index(drop=True)
+            self._chunks = self._format(fresh)
+        self._header = ",".join(fresh.columns) + "\n"
+        self.signals = fresh
+
+        tmp = self.signals_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            f.write(self._header)
+            f.writelines(self._chunks[c] for c in sorted(self._chunks))
+        os.replace(tmp, self.signals_path)
+        self._written(self.signals_path)
+
+        publish(fresh, self.signals_path.parent / "signal_store")
+        record_run(fresh, self.signals_path.parent / "signal_history", centers=centers, note="ingest")
+        replace_rollups(fresh, centers, self.signals_path)
+        return len(d)
+
+
+# -------------------------------------------------
+# Service
+# -------------------------------------------------
+
+class IngestService:
+    """Drop-directory watcher + HTTP endpoint feeding a single batch writer."""
+
+    def __init__(
+        self,
+        daily_path: str | Path = "data/processed/visaops_daily.csv",
+        signals_path: str | Path = "data/processed/visaops_signals.csv",
+        drop_dir: str | Path | None = None,
+        host: str = "127.0.0.1",
+        port: int | None = 8765,
+        batch_size: int = 10_000,
+        flush_interval: float = 1.0,
+        parse_concurrency: int = 16,
+        poll_interval: float = 0.5,
+        dead_letter_dir: str | Path | None = None,
+    ):
+        self.daily_path = Path(daily_path)
+        self.signals_path = Path(signals_path)
+        self.store = IngestStore(self.daily_path, self.signals_path)
+        self.drop_dir = Path(drop_dir) if drop_dir else None
+        self.dead_letter_dir = Path(dead_letter_dir) if dead_letter_dir else self.daily_path.parent / "ingest_dead_letter"
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+
+        self.queue: asyncio.Queue[list[dict]] = asyncio.Queue()
+        self.parse_slots = asyncio.Semaphore(parse_concurrency)
+        self.in_flight: set[Path] = set()
+        self.stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "batches": 0,
+            "centers_refreshed": 0,
+            "flush_failures": 0,
+            "dead_lettered": 0,
+            "lost": 0,
+        }
+
+    # ---------- HTTP ----------
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        status, body = 500, {"error": "internal error"}
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, value = line.decode("latin-1").split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            payload = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method != "POST" or urlparse(path).path != "/ingest":
+                status, body = 404, {"error": "POST /ingest only"}
+            else:
+                fmt = "csv" if "csv" in headers.get("content-type", "") else "json"
+                async with self.parse_slots:
+                    if len(payload) > 64_000:
+                        records, errors = await asyncio.to_thread(parse_payload, payload, fmt)
+                    else:
+                        records, errors = parse_payload(payload, fmt)
+                await self._enqueue(records, errors)
+                status = 202
+                body = {"accepted": len(records), "rejected": len(errors), "errors": errors[:10]}
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, body = 400, {"error": str(e)}
+        finally:
+            data = json.dumps(body).encode()
+            reason = {202: "Accepted", 400: "Bad Request", 404: "Not Found"}.get(status, "Error")
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data
+            )
+            try:
+                await writer.drain()
+            finally:
+                writer.close()
+
+    # ---------- Drop directory ----------
+
+    async def watch_drop_dir(self) -> None:
+        """
+        Poll the drop directory. Producers should write to a dot-file and
+        rename it into place so half-written files are never picked up.
+        """
+        for sub in ("processed", "rejected"):
+            (self.drop_dir / sub).mkdir(parents=True, exist_ok=True)
+
+        while True:
+            for entry in os.scandir(self.drop_dir):
+                path = Path(entry.path)
+                if (
+                    entry.is_file()
+                    and not entry.name.startswith(".")
+                    and path.suffix in DROP_SUFFIXES
+                    and path not in self.in_flight
+                ):
+                    self.in_flight.add(path)
+                    asyncio.create_task(self._ingest_file(path))
+            await asyncio.sleep(self.poll_interval)
+
+    async def _ingest_file(self, path: Path) -> None:
+        try:
+            try:
+                async with self.parse_slots:
+                    data = await asyncio.to_thread(path.read_bytes)
+                    records, errors = await asyncio.to_thread(parse_payload, data, DROP_SUFFIXES[path.suffix])
+                await self._enqueue(records, errors)
+                dest = "processed"
+            except (ValueError, OSError) as e:
+                print(f"Rejected {path.name}: {e}")
+                self.stats["rejected"] += 1
+                dest = "rejected"
+            await asyncio.to_thread(os.replace, path, self.drop_dir / dest / path.name)
+        except OSError as e:
+            # file vanished or is not ours to move; picked up again if it is still there
+            print(f"Could not move {path.name} to {dest}/: {e}")
+        finally:
+            self.in_flight.discard(path)
+
+    # ---------- Batch writer ----------
+
+    async def _enqueue(self, records: list[dict], errors: list[str]) -> None:
+        self.stats["rejected"] += len(errors)
+        if records:
+            await self.queue.put(records)
+
+    async def batch_writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = list(await self.queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.extend(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._flush, batch)
+            except Exception as e:  # keep the writer alive; the batch goes to the dead-letter dir
+                self.stats["flush_failures"] += 1
+                print(f"Flush of {len(batch)} records failed: {e!r}")
+                await asyncio.to_thread(self._dead_letter, batch)
+
+    def _dead_letter(self, batch: list[dict]) -> None:
+        """
+        Save a batch that could not be flushed as JSON Lines; dropping the
+        file into the drop directory replays it (later reports win).
+        """
+        path = self.dead_letter_dir / f"batch-{time.time_ns()}.jsonl"
+        try:
+            self.dead_letter_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text("".join(json.dumps(r, default=str) + "\n" for r in batch))
+            self.stats["dead_lettered"] += len(batch)
+            print(f"Dead-lettered {len(batch)} records -> {path}")
+        except OSError as e:
+            self.stats["lost"] += len(batch)
+            print(f"Could not dead-letter {len(batch)} records: {e}")
+
+    def _flush(self, batch: list[dict]) -> None:
+        t0 = time.perf_counter()
+        changed = self.store.append(batch)
+        self.store.refresh(changed)
+
+        self.stats["accepted"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["centers_refreshed"] += len(changed)
+        print(
+            f"Flushed {len(batch)} records for {len(changed)} centers "
+            f"in {time.perf_counter() - t0:.2f}s (totals: {self.stats})"
+        )
+
+    # ---------- Entry point ----------
+
+    async def run(self, run_for: float | None = None) -> None:
+        tasks = [asyncio.create_task(self.batch_writer())]
+        server = None
+
+        if self.port is not None:
+            server = await asyncio.start_server(self.handle_http, self.host, self.port, backlog=4096)
+            print(f"Listening on http://{self.host}:{self.port}/ingest")
+        if self.drop_dir is not None:
+            self.drop_dir.mkdir(parents=True, exist_ok=True)
+            tasks.append(asyncio.create_task(self.watch_drop_dir()))
+            print(f"Watching {self.drop_dir}")
+
+        try:
+            if run_for is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.sleep(run_for)
+                # let the writer drain what is already queued
+                while not self.queue.empty():
+                    await asyncio.sleep(self.flush_interval)
+                await asyncio.sleep(self.flush_interval + 0.1)
+        finally:
+            for t in tasks:
+                t.cancel()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+
+# -------------------------------------------------
+# Stand-in feeder (load testing)
+# -------------------------------------------------
+
+def fake_snapshots(n_centers: int, day: str, seed: int = 0) -> list[dict]:
+    """One plausible snapshot per synthetic center for `day`."""
+    rng = np.random.default_rng(seed)
+    demand = rng.normal(260, 30, n_centers).clip(50)
+    capacity = rng.normal(280, 25, n_centers).clip(50)
+    queue = rng.gamma(2.0, 40.0, n_centers)
+    processed = np.minimum(demand + queue, capacity)
+    return [
+        {
+            "date": day,
+            "center": f"Center-{i:05d}",
+            "demand_apps": round(float(demand[i]), 2),
+            "capacity_apps": round(float(capacity[i]), 2),
+            "processed_apps": round(float(processed[i]), 2),
+            "queue_size": round(float(queue[i]), 2),
+            "avg_tat_days": round(3.0 + 0.015 * float(queue[i]), 2),
+        }
+        for i in range(n_centers)
+    ]
+
+
+async def _post(host: str, port: int, path: str, record: dict) -> int:
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(record).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status
+
+
+async def feed_http(url: str, records: list[dict], concurrency: int = 500) -> dict:
+    """POST every record concurrently (one request per center)."""
+    u = urlparse(url)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(rec: dict) -> int:
+        async with slots:
+            try:
+                return await _post(u.hostname, u.port or 80, u.path or "/ingest", rec)
+            except OSError:
+                return 0
+
+    statuses = await asyncio.gather(*(one(r) for r in records))
+    return {"sent": len(records), "accepted": sum(s == 202 for s in statuses)}
+
+
+async def feed_drop_dir(drop_dir: Path, records: list[dict]) -> dict:
+    """Write one JSON file per center (dot-file + rename, as producers should)."""
+    drop_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(rec: dict) -> None:
+        name = f"{rec['center']}_{rec['date']}.json"
+        tmp = drop_dir / f".{name}"
+        tmp.write_text(json.dumps(rec))
+        os.replace(tmp, drop_dir / name)
+
+    await asyncio.gather(*(asyncio.to_thread(write, r) for r in records))
+    return {"sent": len(records), "accepted": len(records)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest per-center daily snapshots.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    serve = sub.add_parser("serve", help="Run the ingestion service")
+    serve.add_argument("--drop-dir", default=None, help="Directory to watch for file drops")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765, help="HTTP port (0 disables the endpoint)")
+    serve.add_argument("--daily", default="data/processed/visaops_daily.csv", help="Daily store CSV")
+    serve.add_argument("--signals", default="data/processed/visaops_signals.csv", help="Signals CSV")
+    serve.add_argument("--batch-size", type=int, default=10_000)
+    serve.add_argument("--flush-interval", type=float, default=1.0, help="Max seconds to wait for a batch")
+    serve.add_argument("--run-for", type=float, default=None, help="Stop after N seconds")
+
+    feed = sub.add_parser("feed", help="Stand-in feeder for load testing")
+    feed.add_argument("--centers", type=int, default=1000)
+    feed.add_argument("--date", default=date_cls.today().isoformat())
+    feed.add_argument("--url", default="http://127.0.0.1:8765/ingest")
+    feed.add_argument("--drop-dir", default=None, help="Write files instead of POSTing")
+    feed.add_argument("--concurrency", type=int, default=500)
+
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        service = IngestService(
+            daily_path=args.daily,
+            signals_path=args.signals,
+            drop_dir=args.drop_dir,
+            host=args.host,
+            port=args.port or None,
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+        )
+        try:
+            asyncio.run(service.run(run_for=args.run_for))
+        except KeyboardInterrupt:
+            pass
+        print(f"Stopped. Totals: {service.stats}")
+        return
+
+    records = fake_snapshots(args.centers, args.date)
+    t0 = time.perf_counter()
+    if args.drop_dir:
+        res = asyncio.run(feed_drop_dir(Path(args.drop_dir), records))
+    else:
+        res = asyncio.run(feed_http(args.url, records, concurrency=args.concurrency))
+    elapsed = time.perf_counter() - t0
+    print(f"Fed {res['sent']} centers ({res['accepted']} accepted) in {elapsed:.2f}s "
+          f"({res['sent'] / elapsed:.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
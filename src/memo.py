@@ -0,0 +1,333 @@
+"""
+Risk memos and bulk export bundles.
+
+`build_memo_markdown` renders one center's memo from precomputed inputs
+(`memo_inputs`): the latest row per center, the driver table and summary,
+and the early-warning episodes. Sections that are the same in every memo
+(top risk centers, episode summary by center) are rendered once there.
+
+`write_bundle` exports memos (Markdown + HTML), driver tables and status
+snapshots for many centers into a ZIP:
+- memos are generated in a process pool; each worker receives the inputs
+  once through its initializer, tasks are just center names
+- at most `max_in_flight` centers are pending at a time and each result is
+  written into the archive as soon as it arrives, so memory stays bounded
+  regardless of the number of centers
+- the archive can be any writable file object, including a non-seekable
+  stream (stdout, an HTTP response)
+
+Reads:  data/processed/visaops_signals.csv, data/processed/episode_catalogue/
+Writes: reports/visaops_bundle_<timestamp>.zip (CLI)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO
+
+import markdown
+import pandas as pd
+
+from charts import safe_name
+from drivers import center_drivers, driver_summary, driver_table
+
+STATUS_COLUMNS = ["center", "regime", "stress_index", "avg_tat_days", "queue_size", "utilization"]
+
+MEMO_HTML = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>VisaOps Risk Memo — {center}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 36px; color: #222; }}
+table {{ border-collapse: collapse; margin: 8px 0 16px; font-size: 12px; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; }}
+th {{ background: #f3f3f3; }}
+</style>
+</head>
+<body>
+{content}
+</body>
+</html>
+"""
+
+# Tables shared by every memo: markdown key -> (placeholder, pre-rendered HTML key)
+SHARED_TABLES = {
+    "top5_md": ("@@TOP5@@", "top5_html"),
+    "ep_summary_md": ("@@EPSUMMARY@@", "ep_summary_html"),
+}
+
+
+# -------------------------------------------------
+# Inputs
+# -------------------------------------------------
+
+def episode_summary(ep: pd.DataFrame | None) -> pd.DataFrame:
+    if ep is None or ep.empty:
+        return pd.DataFrame(columns=["center", "episodes", "early_warnings", "detection_rate", "avg_lead_time_days"])
+
+    rows = []
+    for c, g in ep.groupby("center"):
+        total = len(g)
+        detected = g["lead_time_days"].notna().sum()
+        rate = detected / total if total else 0.0
+        avg_lead = g["lead_time_days"].mean()
+        rows.append(
+            {
+                "center": c,
+                "episodes": total,
+                "early_warnings": int(detected),
+                "detection_rate": round(rate, 2),
+                "avg_lead_time_days": round(avg_lead, 2) if detected > 0 else None,
+            }
+        )
+    return pd.DataFrame(rows).sort_values("center").reset_index(drop=True)
+
+
+def latest_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Last row of every center, highest stress first."""
+    return (
+        df.sort_values("date")
+          .groupby("center", as_index=False)
+          .tail(1)
+          .sort_values("stress_index", ascending=False)
+          .reset_index(drop=True)
+    )
+
+
+def memo_inputs(
+    df: pd.DataFrame,
+    episodes: pd.DataFrame | None = None,
+    latest: pd.DataFrame | None = None,
+    drivers: pd.DataFrame | None = None,
+    summary: pd.DataFrame | None = None,
+    generated_at: datetime | None = None,
+) -> dict:
+    """
+    Everything `build_memo_markdown` needs, for all centers. Pieces the
+    caller already has (latest rows, driver table / summary) are reused.
+    The shared tables are rendered to Markdown and HTML here, once.
+    """
+    latest = latest if latest is not None else latest_rows(df)
+    drivers = drivers if drivers is not None else driver_table(df)
+    summary = summary if summary is not None else driver_summary(drivers)
+    generated_at = generated_at or datetime.now(timezone.utc)
+
+    top5 = latest.head(5)[STATUS_COLUMNS]
+    inputs = {
+        "generated_at": generated_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "latest": latest.set_index("center"),
+        "drivers": drivers,
+        "driver_groups": dict(tuple(drivers.groupby("center", sort=False))),
+        "driver_summary": summary.set_index("center")["summary"],
+        "episodes": episodes,
+        "episode_groups": {} if episodes is None else dict(tuple(episodes.groupby("center", sort=False))),
+        "top5_md": top5.to_markdown(index=False),
+        "ep_summary_md": episode_summary(episodes).to_markdown(index=False),
+    }
+    for key, (_, html_key) in SHARED_TABLES.items():
+        inputs[html_key] = markdown.markdown(inputs[key], extensions=["tables"])
+    return inputs
+
+
+# -------------------------------------------------
+# Memo rendering
+# -------------------------------------------------
+
+def build_memo_markdown(center: str, inputs: dict) -> str:
+    last = inputs["latest"].loc[center]
+    episodes = inputs["episodes"]
+
+    lines = []
+    lines.append(f"# VisaOps Risk Memo — {center}")
+    lines.append("")
+    lines.append(f"Generated (UTC): **{inputs['generated_at']}**")
+    lines.append("")
+    lines.append("## Current Status")
+    lines.append(f"- Regime: **{last['regime']}**")
+    lines.append(f"- Stress Index: **{float(last['stress_index']):.2f}**")
+    lines.append(f"- Avg TAT (days): **{float(last['avg_tat_days']):.2f}**")
+    lines.append(f"- Queue Size: **{float(last['queue_size']):.0f}**")
+    lines.append(f"- Utilization: **{float(last['utilization']):.2f}**")
+    lines.append("")
+    lines.append("## Top Risk Centers (latest day)")
+    lines.append("")
+    lines.append(inputs["top5_md"])
+    lines.append("")
+
+    lines.append("## Last 7 Days — Key Operational Drivers")
+    lines.append("")
+    lines.append(center_drivers(inputs["driver_groups"][center], center).round(2).to_markdown(index=False))
+    lines.append("")
+    lines.append(inputs["driver_summary"].loc[center])
+    lines.append("")
+
+    lines.append("## Early Warning Performance")
+    if episodes is None or episodes.empty:
+        lines.append("_No early-warning episodes file found. Run `python src/early_warning.py`._")
+    else:
+        lines.append("### Summary by Center")
+        lines.append(inputs["ep_summary_md"])
+        lines.append("")
+        lines.append("### Episodes for Selected Center")
+        ep_c = inputs["episode_groups"].get(center)
+        if ep_c is None or ep_c.empty:
+            lines.append("_No stressed episodes detected for this center._")
+        else:
+            show_cols = ["stress_start", "warning_start", "lead_time_days"]
+            lines.append(ep_c.sort_values("stress_start")[show_cols].to_markdown(index=False))
+
+    lines.append("")
+    lines.append("## Notes")
+    lines.append("- This demo uses synthetic, non-sensitive operational data.")
+    lines.append("- Stress Index is a weighted combination of utilization, backlog velocity, and TAT volatility (center-normalized).")
+    lines.append("- Regimes are rule-based thresholds on Stress Index (stable/elevated/stressed).")
+    return "\n".join(lines)
+
+
+def build_memo(center: str, inputs: dict) -> tuple[str, str]:
+    """
+    (Markdown, HTML) memo. The memo is built once with placeholders for the
+    shared tables (the episode summary covers every center), which are
+    filled with their Markdown / HTML rendered once in `memo_inputs`.
+    """
+    tokens = {key: token for key, (token, _) in SHARED_TABLES.items()}
+    md = build_memo_markdown(center, {**inputs, **tokens})
+    body = markdown.markdown(md, extensions=["tables"])
+    for key, (token, html_key) in SHARED_TABLES.items():
+        md = md.replace(token, inputs[key])
+        body = body.replace(f"<p>{token}</p>", inputs[html_key])
+    return md, MEMO_HTML.format(center=center, content=body)
+
+
+def status_csv(inputs: dict, centers: list[str] | None = None) -> str:
+    rep = inputs["latest"].reset_index()[STATUS_COLUMNS]
+    if centers is not None:
+        rep = rep[rep["center"].isin(centers)]
+    rep = rep.assign(generated_at_utc=inputs["generated_at"])
+    return rep.to_csv(index=False)
+
+
+# -------------------------------------------------
+# Bulk export (process pool -> streaming ZIP)
+# -------------------------------------------------
+
+_WORKER_INPUTS: dict = {}
+
+
+def _init_worker(inputs: dict) -> None:
+    global _WORKER_INPUTS
+    _WORKER_INPUTS = inputs
+
+
+def _center_files(center: str) -> list[tuple[str, bytes]]:
+    md, html = build_memo(center, _WORKER_INPUTS)
+    drivers = _WORKER_INPUTS["driver_groups"][center]
+    name = safe_name(center)  # a "/" in a label would nest ZIP entries
+    return [
+        (f"memos/memo_{name}.md", md.encode("utf-8")),
+        (f"memos/memo_{name}.html", html.encode("utf-8")),
+        (f"drivers/drivers_{name}.csv", drivers.to_csv(index=False).encode("utf-8")),
+    ]
+
+
+def write_bundle(
+    inputs: dict,
+    fileobj: BinaryIO,
+    centers: list[str] | None = None,
+    processes: int | None = None,
+    max_in_flight: int | None = None,
+) -> int:
+    """
+    Write the export ZIP for `centers` (default: all) to `fileobj`:
+    status.csv (network snapshot of the selected centers), drivers.csv
+    (their driver table), and per center memos/memo_<c>.md / .html and
+    drivers/drivers_<c>.csv (<c> = `charts.safe_name(center)`).
+    `processes=1` renders in-process. Returns the number of files written.
+    """
+    centers = list(centers) if centers is not None else inputs["latest"].index.tolist()
+    processes = max(1, min(processes or os.cpu_count() or 1, len(centers) or 1))
+    max_in_flight = max_in_flight or 4 * processes
+    drivers = inputs["drivers"]
+
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        zf.writestr("status.csv", status_csv(inputs, centers))
+        zf.writestr("drivers.csv", drivers[drivers["center"].isin(centers)].to_csv(index=False))
+        n = 2
+
+        def write(files: list[tuple[str, bytes]]) -> None:
+            nonlocal n
+            for name, data in files:
+                zf.writestr(name, data)
+                n += 1
+
+        if processes == 1:
+            _init_worker(inputs)
+            for c in centers:
+                write(_center_files(c))
+            return n
+
+        todo = iter(centers)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(inputs,)) as pool:
+            pending = {pool.submit(_center_files, c) for c in _take(todo, max_in_flight)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    write(fut.result())
+                pending |= {pool.submit(_center_files, c) for c in _take(todo, len(done))}
+    return n
+
+
+def _take(it, k: int) -> list:
+    out = []
+    for x in it:
+        out.append(x)
+        if len(out) >= k:
+            break
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export memos, driver tables and status for many centers as a ZIP.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--centers", nargs="*", default=None, help="Centers to export (default: all)")
+    parser.add_argument("--regime", default=None, help="Only centers currently in this regime")
+    parser.add_argument("--output", default=None, help="ZIP path, or - for stdout (default: reports/visaops_bundle_<ts>.zip)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    from episode_catalogue import EpisodeCatalogue
+
+    df = pd.read_csv(args.input)
+    df["date"] = pd.to_datetime(df["date"])
+    catalogue = EpisodeCatalogue()
+    episodes = catalogue.episodes if len(catalogue.state) else None
+
+    t0 = time.perf_counter()
+    inputs = memo_inputs(df, episodes)
+    centers = args.centers
+    if args.regime:
+        latest = inputs["latest"]
+        centers = [c for c in (centers or latest.index) if latest.loc[c, "regime"] == args.regime]
+
+    if args.output == "-":
+        n = write_bundle(inputs, sys.stdout.buffer, centers, args.processes)
+        print(f"Wrote {n} files in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+        return
+
+    out = Path(args.output or f"reports/visaops_bundle_{datetime.now(timezone.utc):%Y%m%d_%H%M}.zip")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "wb") as f:
+        n = write_bundle(inputs, f, centers, args.processes)
+    print(f"Wrote {n} files ({out.stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - t0:.2f}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,50 +2,26 @@
 Visualize operational stress with regime shading for one center.
 """
 
+import argparse
+
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from charts import render_center
 
 
 def main():
-    df = pd.read_csv("data/processed/visaops_signals.csv")
+    parser = argparse.ArgumentParser(description="Plot stress index with regime shading for a center.")
+    parser.add_argument("--center", default="Delhi", help="Center name to plot")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input CSV path")
+    parser.add_argument("--output", default=None, help="Output PNG path")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
     df["date"] = pd.to_datetime(df["date"])
 
-    center = "Delhi"
-    d = df[df["center"] == center].sort_values("date")
-
-    plt.figure()
-
-    # Plot stress index
-    plt.plot(d["date"], d["stress_index"], label="Stress Index")
-
-    # Shade regimes
-    for regime, color in [
-        ("stable", "#d4f4dd"),
-        ("elevated", "#fff3cd"),
-        ("stressed", "#f8d7da"),
-    ]:
-        mask = d["regime"] == regime
-        plt.fill_between(
-            d["date"],
-            d["stress_index"].min(),
-            d["stress_index"].max(),
-            where=mask,
-            color=color,
-            alpha=0.4,
-            label=regime if regime not in plt.gca().get_legend_handles_labels()[1] else None,
-        )
-
-    plt.axhline(0, linestyle="--", linewidth=1)
-    plt.title(f"Operational Stress & Regimes – {center}")
-    plt.xlabel("Date")
-    plt.ylabel("Stress Index")
-    plt.xticks(rotation=30)
-    plt.legend()
-    plt.tight_layout()
-
-    out_path = "data/processed/stress_regimes_delhi.png"
-    plt.savefig(out_path)
-    plt.close()
+    center = args.center
+    out_path = args.output or f"data/processed/stress_regimes_{center.lower()}.png"
+    render_center(df, center, out_path)
 
     print(f"Saved plot -> {out_path}")
 
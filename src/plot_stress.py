@@ -1,7 +1,7 @@
-import os
 import argparse
 import pandas as pd
-import matplotlib
+
+from charts import render_center
 
 """
 Simple visualization of operational stress over time for one center.
@@ -9,14 +9,10 @@ Simple visualization of operational stress over time for one center.
 Saves the plot to a PNG file instead of displaying it (headless environment).
 """
 
-matplotlib.use("Agg")  # headless backend
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-
 
 def plot_center(df: pd.DataFrame, center: str, out_path: str) -> None:
-    if "date" not in df.columns or "center" not in df.columns or "stress_index" not in df.columns:
-        raise ValueError("Input CSV must contain 'date', 'center', and 'stress_index' columns.")
+    if not {"date", "center", "stress_index", "regime"}.issubset(df.columns):
+        raise ValueError("Input CSV must contain 'date', 'center', 'stress_index', and 'regime' columns.")
 
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
     d = df[df["center"] == center].dropna(subset=["date"]).sort_values("date")
@@ -24,25 +20,7 @@ def plot_center(df: pd.DataFrame, center: str, out_path: str) -> None:
         available = ", ".join(sorted(df["center"].unique()))
         raise ValueError(f"No data for center '{center}'. Available centers: {available}")
 
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-
-    plt.style.use("seaborn-v0_8")
-    fig, ax = plt.subplots(figsize=(10, 4.5))
-    ax.plot(d["date"], d["stress_index"], marker="o", linestyle="-", linewidth=1)
-    ax.axhline(0, linestyle="--", color="gray", linewidth=0.8)
-    ax.set_title(f"Operational Stress Index — {center}")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Stress Index")
-
-    locator = mdates.AutoDateLocator()
-    formatter = mdates.ConciseDateFormatter(locator)
-    ax.xaxis.set_major_locator(locator)
-    ax.xaxis.set_major_formatter(formatter)
-    plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
-
-    fig.tight_layout()
-    fig.savefig(out_path, dpi=150, bbox_inches="tight")
-    plt.close(fig)
+    render_center(d, center, out_path, figsize=(10, 4.5))
 
 
 def main():
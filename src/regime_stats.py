@@ -0,0 +1,307 @@
+"""
+Regime transition and dwell-time statistics for every center at once.
+
+From each center's daily regime sequence:
+- transition matrices P[from, to] (day-over-day, stable/elevated/stressed)
+- dwell times: run-length encoded regime spells, their count, mean and max
+  length, and the full length distribution
+- expected days until 'stressed' from each state, treating stressed as
+  absorbing: t = (I - Q)^-1 1 over the non-stressed block Q of P
+- rolling-window transition probabilities, to detect drift
+
+Everything is integer coding plus `np.bincount` over (center, from, to) or
+(center, regime, length) keys, and the hitting times are one batched
+`np.linalg.solve`, so hundreds of centers take milliseconds.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/regime_transitions.csv, data/processed/regime_dwell.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from signals import REGIMES
+
+K = len(REGIMES)
+STRESSED = REGIMES.index("stressed")
+
+
+def encode(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    """
+    Sort by (center, date) and integer-code it. Returns (center_codes,
+    regime_codes, dates, centers); unknown regime labels raise ValueError.
+    """
+    d = df[["center", "date", "regime"]].sort_values(["center", "date"], kind="stable")
+    codes, centers = pd.factorize(d["center"], sort=True)
+    regime = pd.Categorical(d["regime"], categories=REGIMES).codes.astype(np.int64)
+    if (regime < 0).any():
+        raise ValueError(f"regime must be one of {REGIMES}")
+    return codes.astype(np.int64), regime, pd.to_datetime(d["date"]).to_numpy(), list(centers)
+
+
+def _same_center(codes: np.ndarray) -> np.ndarray:
+    """True at row t when row t+1 belongs to the same center (len n - 1)."""
+    return codes[1:] == codes[:-1]
+
+
+# -------------------------------------------------
+# Transition matrices
+# -------------------------------------------------
+
+def transition_counts(codes: np.ndarray, regime: np.ndarray, n_centers: int) -> np.ndarray:
+    """(centers, K, K) day-over-day transition counts."""
+    same = _same_center(codes)
+    key = (codes[:-1] * K + regime[:-1]) * K + regime[1:]
+    return np.bincount(key[same], minlength=n_centers * K * K).reshape(n_centers, K, K)
+
+
+def transition_probs(counts: np.ndarray) -> np.ndarray:
+    """Row-normalize counts; rows with no observations are NaN."""
+    total = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, counts / total, np.nan)
+
+
+def expected_days_to_stressed(probs: np.ndarray) -> np.ndarray:
+    """
+    (centers, K) expected days until the first stressed day from each
+    regime (0 for stressed itself). Stressed is made absorbing and the
+    transient block solved for every center in one batched call; states
+    that cannot reach stressed (or were never observed) get inf / NaN.
+    """
+    transient = [i for i in range(K) if i != STRESSED]
+    q = np.nan_to_num(probs[:, transient][:, :, transient])
+    a = np.eye(len(transient)) - q
+
+    out = np.zeros(probs.shape[:2])
+    singular = np.abs(np.linalg.det(a)) < 1e-12
+    ok = ~singular
+    t = np.full((len(probs), len(transient)), np.inf)
+    if ok.any():
+        t[ok] = np.linalg.solve(a[ok], np.ones((ok.sum(), len(transient), 1)))[..., 0]
+
+    observed = ~np.isnan(probs[:, transient]).all(axis=-1)
+    out[:, transient] = np.where(observed, t, np.nan)
+    return out
+
+
+# -------------------------------------------------
+# Dwell times (run-length encoding)
+# -------------------------------------------------
+
+def regime_runs(codes: np.ndarray, regime: np.ndarray) -> pd.DataFrame:
+    """
+    Run-length encode every center's regime sequence. `censored` marks the
+    last run of each center (still ongoing, so its length is a lower bound).
+    """
+    n = len(codes)
+    if n == 0:
+        return pd.DataFrame(columns=["center_code", "regime_code", "start", "length", "censored"])
+    change = np.ones(n, dtype=bool)
+    change[1:] = (codes[1:] != codes[:-1]) | (regime[1:] != regime[:-1])
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.r_[starts, n])
+    last_of_center = np.r_[codes[starts[1:]] != codes[starts[:-1]], True]
+    return pd.DataFrame(
+        {
+            "center_code": codes[starts],
+            "regime_code": regime[starts],
+            "start": starts,
+            "length": lengths,
+            "censored": last_of_center,
+        }
+    )
+
+
+def dwell_stats(runs: pd.DataFrame, n_centers: int) -> dict[str, np.ndarray]:
+    """
+    Per (center, regime) spell statistics from completed runs:
+    spells, mean_days, max_days; plus current_days (the ongoing run).
+    """
+    done = runs[~runs["censored"]]
+    key = done["center_code"].to_numpy() * K + done["regime_code"].to_numpy()
+    length = done["length"].to_numpy()
+
+    spells = np.bincount(key, minlength=n_centers * K)
+    total = np.bincount(key, weights=length, minlength=n_centers * K)
+    longest = np.zeros(n_centers * K)
+    np.maximum.at(longest, key, length)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(spells > 0, total / spells, np.nan)
+
+    ongoing = runs[runs["censored"]]
+    current = np.zeros(n_centers, dtype=np.int64)
+    current_regime = np.full(n_centers, -1)
+    current[ongoing["center_code"].to_numpy()] = ongoing["length"].to_numpy()
+    current_regime[ongoing["center_code"].to_numpy()] = ongoing["regime_code"].to_numpy()
+
+    return {
+        "spells": spells.reshape(n_centers, K),
+        "mean_days": mean.reshape(n_centers, K),
+        "max_days": longest.reshape(n_centers, K),
+        "current_regime": current_regime,
+        "current_days": current,
+    }
+
+
+def dwell_distribution(runs: pd.DataFrame, centers: list[str]) -> pd.DataFrame:
+    """Tidy histogram of completed spell lengths: center, regime, days, spells."""
+    done = runs[~runs["censored"]]
+    max_len = int(done["length"].max()) if len(done) else 0
+    key = (done["center_code"].to_numpy() * K + done["regime_code"].to_numpy()) * (max_len + 1) + done["length"].to_numpy()
+    hist = np.bincount(key, minlength=len(centers) * K * (max_len + 1))
+    nz = np.flatnonzero(hist)
+    c, rest = np.divmod(nz, K * (max_len + 1))
+    r, days = np.divmod(rest, max_len + 1)
+    return pd.DataFrame(
+        {
+            "center": np.asarray(centers, dtype=object)[c],
+            "regime": np.asarray(REGIMES, dtype=object)[r],
+            "days": days,
+            "spells": hist[nz],
+        }
+    )
+
+
+# -------------------------------------------------
+# Network tables
+# -------------------------------------------------
+
+def regime_stats(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Returns (transitions, summary):
+    - transitions: tidy center, from, to, count, prob
+    - summary: one row per center with current regime and spell length,
+      dwell stats per regime, P(stay) per regime and expected days to
+      stressed from every regime and from the current one
+    """
+    codes, regime, _, centers = encode(df)
+    n_centers = len(centers)
+
+    counts = transition_counts(codes, regime, n_centers)
+    probs = transition_probs(counts)
+    hit = expected_days_to_stressed(probs)
+    runs = regime_runs(codes, regime)
+    dwell = dwell_stats(runs, n_centers)
+
+    c, f, t = np.indices(counts.shape).reshape(3, -1)
+    transitions = pd.DataFrame(
+        {
+            "center": np.asarray(centers, dtype=object)[c],
+            "from": np.asarray(REGIMES, dtype=object)[f],
+            "to": np.asarray(REGIMES, dtype=object)[t],
+            "count": counts.ravel(),
+            "prob": probs.ravel(),
+        }
+    )
+
+    cur = dwell["current_regime"]
+    summary = pd.DataFrame(
+        {
+            "center": centers,
+            "current_regime": np.asarray(REGIMES, dtype=object)[np.maximum(cur, 0)],
+            "current_days": dwell["current_days"],
+            "days_to_stressed": hit[np.arange(n_centers), np.maximum(cur, 0)],
+        }
+    )
+    for i, r in enumerate(REGIMES):
+        summary[f"p_stay_{r}"] = probs[:, i, i]
+        summary[f"{r}_spells"] = dwell["spells"][:, i]
+        summary[f"{r}_mean_days"] = dwell["mean_days"][:, i]
+        summary[f"{r}_max_days"] = dwell["max_days"][:, i]
+        if i != STRESSED:
+            summary[f"days_to_stressed_from_{r}"] = hit[:, i]
+    return transitions, summary
+
+
+def rolling_transitions(df: pd.DataFrame, window: int = 90, step: int = 7) -> pd.DataFrame:
+    """
+    Transition probabilities over trailing `window`-day windows ending every
+    `step` rows, per center. Counts come from a per-center cumulative sum of
+    one-hot transitions, so each window is a single subtraction.
+    Tidy output: center, date, from, to, count, prob.
+    """
+    codes, regime, dates, centers = encode(df)
+    n = len(codes)
+    if n < 2:
+        return pd.DataFrame(columns=["center", "date", "from", "to", "count", "prob"])
+
+    # one-hot transition into row t (from t-1), zero on each center's first row
+    onehot = np.zeros((n, K * K), dtype=np.int32)
+    same = np.r_[False, _same_center(codes)]
+    rows = np.flatnonzero(same)
+    onehot[rows, regime[rows - 1] * K + regime[rows]] = 1
+    cum = np.cumsum(onehot, axis=0)
+
+    bounds = np.searchsorted(codes, np.arange(len(centers) + 1))
+    pos = np.arange(n) - bounds[codes]
+    last = bounds[codes + 1] - 1
+    # window ends: every `step` rows back from each center's latest day, once a full window exists
+    ends = np.flatnonzero(((last - np.arange(n)) % step == 0) & (pos >= window))
+
+    counts = cum[ends] - cum[ends - window]
+    probs = transition_probs(counts.reshape(-1, K, K)).reshape(-1, K * K)
+
+    f, t = np.divmod(np.arange(K * K), K)
+    return pd.DataFrame(
+        {
+            "center": np.repeat(np.asarray(centers, dtype=object)[codes[ends]], K * K),
+            "date": np.repeat(dates[ends], K * K),
+            "from": np.tile(np.asarray(REGIMES, dtype=object)[f], len(ends)),
+            "to": np.tile(np.asarray(REGIMES, dtype=object)[t], len(ends)),
+            "count": counts.ravel(),
+            "prob": probs.ravel(),
+        }
+    )
+
+
+def transition_drift(rolling: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per center: total-variation distance between the transition rows of the
+    latest window and the window one step earlier, averaged over 'from'
+    states (0 = unchanged, 1 = completely different).
+    """
+    r = rolling.dropna(subset=["prob"])
+    dates = r[["center", "date"]].drop_duplicates().sort_values(["center", "date"])
+    last_two = dates.groupby("center").tail(2)
+    r = r.merge(last_two, on=["center", "date"])
+    r["rank"] = r.groupby("center")["date"].rank(method="dense").astype(int)
+
+    wide = r.pivot_table(index=["center", "from", "to"], columns="rank", values="prob")
+    if wide.shape[1] < 2:
+        return pd.DataFrame(columns=["center", "drift"])
+    tv = (wide[2] - wide[1]).abs().groupby(level=["center", "from"]).sum() / 2
+    return tv.groupby(level="center").mean().rename("drift").reset_index()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Regime transition and dwell-time statistics.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--window", type=int, default=90, help="Rolling window (days) for drift")
+    parser.add_argument("--step", type=int, default=7, help="Rows between rolling windows")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+
+    t0 = time.perf_counter()
+    transitions, summary = regime_stats(df)
+    rolling = rolling_transitions(df, window=args.window, step=args.step)
+    drift = transition_drift(rolling)
+    elapsed = time.perf_counter() - t0
+
+    transitions.to_csv("data/processed/regime_transitions.csv", index=False)
+    summary.merge(drift, on="center", how="left").to_csv("data/processed/regime_dwell.csv", index=False)
+
+    print(f"Regime statistics for {len(summary)} centers in {elapsed:.3f}s")
+    cols = ["center", "current_regime", "current_days", "days_to_stressed", "p_stay_stressed", "stressed_mean_days"]
+    print(summary.sort_values("days_to_stressed")[cols].head(10).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
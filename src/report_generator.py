@@ -1,26 +1,25 @@
 from __future__ import annotations
 
+import argparse
 from datetime import datetime, timezone
 from pathlib import Path
 import base64
 
 import pandas as pd
-import markdown
-import matplotlib.pyplot as plt
-from weasyprint import HTML
+
+from charts import render_center, safe_name
+from rollups import load_range
+from drivers import center_drivers, driver_summary, driver_table
+import signal_history
+import signal_store
 
 
 # -----------------------
 # HTML TEMPLATE
 # -----------------------
 
-HTML_TEMPLATE = """
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8">
-<title>VisaOps Risk Report</title>
-<style>
+# Shared with the static site (braces doubled for str.format)
+REPORT_CSS = """
 body {{
   font-family: Arial, sans-serif;
   margin: 36px;
@@ -63,7 +62,15 @@ hr {{
   font-size: 0.9em;
   color: #555;
 }}
-</style>
+"""
+
+HTML_TEMPLATE = """
+<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>VisaOps Risk Report</title>
+<style>""" + REPORT_CSS + """</style>
 </head>
 <body>
 
@@ -117,13 +124,14 @@ def infer_center(md_path: Path) -> str:
     return md_path.stem.replace("memo_", "")
 
 
-def load_signals() -> pd.DataFrame:
+def load_signals(as_of: str | None = None) -> pd.DataFrame:
+    """Latest signals, or the table as published by run / date `as_of`."""
+    if as_of is not None:
+        return signal_history.load_as_of(as_of)
     path = Path("data/processed/visaops_signals.csv")
-    if not path.exists():
+    if not path.exists() and not signal_store.exists():
         raise FileNotFoundError("visaops_signals.csv missing")
-    df = pd.read_csv(path)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+    return signal_store.load_signals(path)
 
 
 # -----------------------
@@ -131,44 +139,17 @@ def load_signals() -> pd.DataFrame:
 # -----------------------
 
 def compute_7d_drivers(df: pd.DataFrame, center: str) -> tuple[list[str], str]:
-    d = df[df["center"] == center].sort_values("date").copy()
-
-    last_14 = d.tail(14)
-    last_7 = last_14.tail(7)
-    prev_7 = last_14.head(7)
-
-    metrics = {
-        "Avg TAT (days)": "avg_tat_days",
-        "Queue velocity": "queue_delta",
-        "Utilization": "utilization",
-    }
-
-    rows = []
-    deltas = {}
-
-    for label, col in metrics.items():
-        cur = last_7[col].mean()
-        prev = prev_7[col].mean()
-        delta = cur - prev
-        deltas[label] = delta
-
-        rows.append(
-            f"<tr><td>{label}</td>"
-            f"<td>{cur:.2f}</td>"
-            f"<td>{prev:.2f}</td>"
-            f"<td>{delta:+.2f}</td></tr>"
-        )
-
-    # Simple rule-based explanation
-    if deltas["Queue velocity"] > 0 and deltas["Avg TAT (days)"] > 0:
-        summary = "Rising stress driven primarily by increasing queue accumulation and turnaround time."
-    elif deltas["Utilization"] > 0.05:
-        summary = "Operational pressure driven by rising utilization over the past week."
-    elif deltas["Queue velocity"] < 0:
-        summary = "Stress easing due to declining queue accumulation."
-    else:
-        summary = "No dominant operational driver detected over the last 7 days."
-
+    table = driver_table(df[df["center"] == center])
+    view = center_drivers(table, center)
+
+    rows = [
+        f"<tr><td>{label}</td>"
+        f"<td>{cur:.2f}</td>"
+        f"<td>{prev:.2f}</td>"
+        f"<td>{delta:+.2f}</td></tr>"
+        for label, cur, prev, delta in view.itertuples(index=False, name=None)
+    ]
+    summary = driver_summary(table)["summary"].iloc[0]
     return rows, summary
 
 
@@ -176,37 +157,11 @@ def compute_7d_drivers(df: pd.DataFrame, center: str) -> tuple[list[str], str]:
 # PLOT
 # -----------------------
 
-def make_plot(df: pd.DataFrame, center: str, out_png: Path):
-    d = df[df["center"] == center].sort_values("date")
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(d["date"], d["stress_index"], linewidth=2)
-    ax.axhline(0, linestyle="--", linewidth=1)
-
-    colors = {
-        "stable": "#d4f4dd",
-        "elevated": "#fff3cd",
-        "stressed": "#f8d7da"
-    }
-
-    ymin, ymax = d["stress_index"].min(), d["stress_index"].max()
-    for r, c in colors.items():
-        ax.fill_between(
-            d["date"],
-            ymin,
-            ymax,
-            where=(d["regime"] == r),
-            alpha=0.35,
-            color=c
-        )
-
-    ax.set_title(f"Stress Index — {center}")
-    ax.tick_params(axis="x", rotation=30)
-    fig.tight_layout()
-
-    out_png.parent.mkdir(parents=True, exist_ok=True)
-    fig.savefig(out_png, dpi=180)
-    plt.close(fig)
+def make_plot(df: pd.DataFrame, center: str, out_png: Path, materialized: bool = True):
+    # resolution follows the history length (daily / weekly / monthly); the
+    # stored rollups only match the latest signals, so older `df` aggregates itself
+    rows, _ = load_range(center, daily=df, materialized=materialized)
+    render_center(rows, center, out_png, dpi=180)
 
 
 def png_to_b64(p: Path) -> str:
@@ -218,19 +173,27 @@ def png_to_b64(p: Path) -> str:
 # -----------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Render the latest memo as a PDF report.")
+    parser.add_argument("--as-of", default=None, help="Signals as of a history run id or date (default: latest)")
+    args = parser.parse_args()
+
+    # PDF-only dependencies; the static site imports this module without them
+    import markdown
+    from weasyprint import HTML
+
     reports = Path("reports")
     reports.mkdir(exist_ok=True)
 
     memo = find_latest_memo()
     center = infer_center(memo)
 
-    df = load_signals()
+    df = load_signals(args.as_of)
 
     ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M")
-    png = reports / f"stress_regime_{center}_{ts}.png"
+    png = reports / f"stress_regime_{safe_name(center)}_{ts}.png"
     pdf = reports / f"visaops_report_{ts}.pdf"
 
-    make_plot(df, center, png)
+    make_plot(df, center, png, materialized=args.as_of is None)
     driver_rows, driver_summary = compute_7d_drivers(df, center)
 
     html_body = markdown.markdown(memo.read_text(), extensions=["tables"])
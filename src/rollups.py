@@ -0,0 +1,224 @@
+"""
+Weekly and monthly rollups of the daily signals, per center.
+
+Each rollup row summarizes one center over one period: mean queue, TAT,
+utilization and stress index, peak queue and stress, and the number of
+days spent in each regime. `date` is the period start and `regime` the
+majority regime (ties go to the more severe one), so rollups plot with the
+same chart code as daily rows.
+
+Rollups are materialized next to the daily signals and refreshed per
+center. `add_signals` re-normalizes a center's whole history whenever it
+gains days, so no stored period is final: `replace_rollups` recomputes
+every period of the changed centers and keeps the other centers' rows as
+stored. Readers pick a resolution from the requested range
+(`choose_resolution`), so long-range views read weekly or monthly rows
+instead of every day.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/visaops_signals_weekly.csv,
+        data/processed/visaops_signals_monthly.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from signals import REGIMES
+
+SIGNALS_PATH = Path("data/processed/visaops_signals.csv")
+
+# resolution -> pandas period frequency
+RESOLUTIONS = {"weekly": "W", "monthly": "M"}
+
+# longest range (days) served at each resolution; beyond the last, monthly
+DAILY_MAX_DAYS = 120
+WEEKLY_MAX_DAYS = 730
+
+ROLLUP_COLUMNS = [
+    "date",
+    "center",
+    "days",
+    "last_date",
+    "queue_size",
+    "queue_size_max",
+    "avg_tat_days",
+    "utilization",
+    "stress_index",
+    "stress_max",
+    *[f"{r}_days" for r in REGIMES],
+    "regime",
+]
+
+
+def rollup_path(resolution: str, signals_path: str | Path = SIGNALS_PATH) -> Path:
+    p = Path(signals_path)
+    return p.with_name(f"{p.stem}_{resolution}{p.suffix}")
+
+
+def rollup(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """Aggregate daily signals to one row per center per period."""
+    d = df[["date", "center", "queue_size", "avg_tat_days", "utilization", "stress_index", "regime"]].copy()
+    d["date"] = pd.to_datetime(d["date"])
+    d["period"] = d["date"].dt.to_period(RESOLUTIONS[resolution]).dt.start_time
+    for r in REGIMES:
+        d[f"{r}_days"] = (d["regime"] == r).astype(int)
+
+    out = (
+        d.groupby(["center", "period"], sort=True)
+        .agg(
+            days=("date", "size"),
+            last_date=("date", "max"),
+            queue_size=("queue_size", "mean"),
+            queue_size_max=("queue_size", "max"),
+            avg_tat_days=("avg_tat_days", "mean"),
+            utilization=("utilization", "mean"),
+            stress_index=("stress_index", "mean"),
+            stress_max=("stress_index", "max"),
+            **{f"{r}_days": (f"{r}_days", "sum") for r in REGIMES},
+        )
+        .reset_index()
+        .rename(columns={"period": "date"})
+    )
+
+    # majority regime; scanning from most severe makes ties go to the worse regime
+    counts = out[[f"{r}_days" for r in reversed(REGIMES)]].to_numpy()
+    out["regime"] = np.asarray(REGIMES[::-1], dtype=object)[counts.argmax(axis=1)]
+    return out[ROLLUP_COLUMNS]
+
+
+def _write(frame: pd.DataFrame, path: Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    frame.to_csv(tmp, index=False, date_format="%Y-%m-%d")
+    os.replace(tmp, path)
+
+
+def _read(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, parse_dates=["date", "last_date"])
+
+
+def build_rollups(df: pd.DataFrame, signals_path: str | Path = SIGNALS_PATH) -> dict[str, int]:
+    """Rebuild every resolution from `df`. Returns rows written per resolution."""
+    written = {}
+    for res in RESOLUTIONS:
+        out = rollup(df, res)
+        _write(out, rollup_path(res, signals_path))
+        written[res] = len(out)
+    return written
+
+
+def replace_rollups(
+    df: pd.DataFrame,
+    centers: set[str],
+    signals_path: str | Path = SIGNALS_PATH,
+) -> dict[str, int]:
+    """
+    Recompute every period of `centers` from `df` (signals) and splice them
+    into the stored rollups; other centers are kept as stored. Returns rows
+    recomputed per resolution.
+    """
+    d = df[df["center"].isin(centers)]
+
+    recomputed = {}
+    for res in RESOLUTIONS:
+        path = rollup_path(res, signals_path)
+        if not path.exists():
+            out = rollup(df, res)
+            _write(out, path)
+            recomputed[res] = len(out)
+            continue
+
+        old = _read(path)
+        new = rollup(d, res)
+        out = pd.concat([old[~old["center"].isin(centers)], new], ignore_index=True)
+        out = out.sort_values(["center", "date"]).reset_index(drop=True)[ROLLUP_COLUMNS]
+        _write(out, path)
+        recomputed[res] = len(new)
+    return recomputed
+
+
+# -------------------------------------------------
+# Readers
+# -------------------------------------------------
+
+def choose_resolution(start: pd.Timestamp, end: pd.Timestamp) -> str:
+    """'daily' up to DAILY_MAX_DAYS, 'weekly' up to WEEKLY_MAX_DAYS, else 'monthly'."""
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    if span <= DAILY_MAX_DAYS:
+        return "daily"
+    if span <= WEEKLY_MAX_DAYS:
+        return "weekly"
+    return "monthly"
+
+
+def load_range(
+    center: str,
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+    daily: pd.DataFrame | None = None,
+    resolution: str | None = None,
+    signals_path: str | Path = SIGNALS_PATH,
+    materialized: bool = True,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Rows for `center` between `start` and `end` (inclusive) at `resolution`
+    (default: chosen from the range). Daily rows come from `daily` when
+    given, otherwise the signals CSV; rollups fall back to aggregating the
+    daily rows if the rollup file is missing or `materialized` is False
+    (e.g. `daily` is an older version of the signals). Returns (rows, resolution).
+    """
+    def daily_rows() -> pd.DataFrame:
+        src = daily if daily is not None else pd.read_csv(signals_path, parse_dates=["date"])
+        return src[src["center"] == center].sort_values("date")
+
+    rows = None
+    if start is None or end is None:
+        rows = daily_rows()
+        start = rows["date"].min() if start is None else start
+        end = rows["date"].max() if end is None else end
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    resolution = resolution or choose_resolution(start, end)
+
+    if resolution == "daily":
+        rows = rows if rows is not None else daily_rows()
+        sel = rows["date"].between(start, end)
+        return rows[sel].reset_index(drop=True), resolution
+
+    path = rollup_path(resolution, signals_path)
+    if materialized and path.exists():
+        r = _read(path)
+        r = r[r["center"] == center]
+    else:
+        r = rollup(rows if rows is not None else daily_rows(), resolution)
+
+    # keep periods that overlap [start, end]
+    sel = (r["last_date"] >= start) & (r["date"] <= end)
+    return r[sel].sort_values("date").reset_index(drop=True), resolution
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build / refresh weekly and monthly signal rollups.")
+    parser.add_argument("--input", default=str(SIGNALS_PATH), help="Input signals CSV")
+    parser.add_argument("--centers", nargs="+", default=None, help="Only rebuild these centers (default: all)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+
+    t0 = time.perf_counter()
+    counts = replace_rollups(df, set(args.centers), args.input) if args.centers else build_rollups(df, args.input)
+    elapsed = time.perf_counter() - t0
+
+    for res, n in counts.items():
+        total = len(_read(rollup_path(res, args.input)))
+        print(f"{res}: {n} rows recomputed, {total} rows -> {rollup_path(res, args.input)}")
+    print(f"Done in {elapsed:.2f}s ({len(df)} daily rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Monte Carlo what-if scenarios for a single center.
+
+Starts from a center's current state (queue, recent demand and capacity)
+and simulates thousands of future paths at once through the `data_gen`
+queue model, with optional capacity cuts or demand surges. Every path is
+then run through the same stress index and regime logic as
+`signals.add_signals` (7-day rolling windows, center-normalized z-scores,
+weighted sum, regime thresholds).
+
+Outputs a per-path table (time-to-stressed, peak queue) and a summary of
+its distribution.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_gen import MIN_DAILY_APPS, TAT_NOISE_SD, step_queue, tat_from_queue
+from signals import STRESS_WEIGHTS, STRESSED_THRESHOLD
+
+WINDOW = 7  # matches the 7-day windows feeding the stress index
+
+
+def shock_profile(
+    horizon: int,
+    factor: float = 1.0,
+    start_day: int = 0,
+    duration_days: int | None = None,
+) -> np.ndarray:
+    """
+    Multiplicative shock per simulated day: `factor` from `start_day` for
+    `duration_days` (or until the end of the horizon), 1.0 elsewhere.
+    """
+    profile = np.ones(horizon)
+    end = horizon if duration_days is None else min(horizon, start_day + duration_days)
+    profile[start_day:end] = factor
+    return profile
+
+
+def simulate_scenario(
+    signals: pd.DataFrame,
+    center: str,
+    horizon: int = 60,
+    n_paths: int = 5000,
+    capacity_factor: float = 1.0,
+    demand_factor: float = 1.0,
+    shock_start_day: int = 0,
+    shock_days: int | None = None,
+    lookback_days: int = 28,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    Simulate `n_paths` futures for `center` as (paths, days) arrays.
+
+    Daily demand and capacity are drawn around their mean over the last
+    `lookback_days` (with the observed day-to-day spread), scaled by the
+    shock factors. The z-score statistics are frozen at the center's
+    historical values so simulated stress is comparable to the dashboard.
+
+    Returns one row per path:
+    - days_to_stressed: first simulated day in the stressed regime (NaN if never)
+    - peak_queue / final_queue: queue size over the horizon
+    - peak_stress: maximum stress index over the horizon
+    """
+    d = signals[signals["center"] == center].sort_values("date")
+    if len(d) < WINDOW:
+        raise ValueError(f"Need at least {WINDOW} days of history for '{center}'.")
+
+    rng = np.random.default_rng(seed)
+    hist = d.tail(lookback_days)
+
+    demand_mu, demand_sd = hist["demand_apps"].mean(), hist["demand_apps"].std(ddof=0)
+    capacity_mu, capacity_sd = hist["capacity_apps"].mean(), hist["capacity_apps"].std(ddof=0)
+
+    demand = np.maximum(
+        MIN_DAILY_APPS,
+        demand_mu * shock_profile(horizon, demand_factor, shock_start_day, shock_days)
+        + rng.normal(0, demand_sd, (n_paths, horizon)),
+    )
+    capacity = np.maximum(
+        MIN_DAILY_APPS,
+        capacity_mu * shock_profile(horizon, capacity_factor, shock_start_day, shock_days)
+        + rng.normal(0, capacity_sd, (n_paths, horizon)),
+    )
+
+    # -------------------------------------------------
+    # Queue dynamics (sequential in time, vectorized over paths)
+    # -------------------------------------------------
+
+    processed = np.empty((n_paths, horizon))
+    queue = np.empty((n_paths, horizon))
+    q = np.full(n_paths, float(d["queue_size"].iloc[-1]))
+
+    for t in range(horizon):
+        processed[:, t], q = step_queue(q, demand[:, t], capacity[:, t])
+        queue[:, t] = q
+
+    tat = tat_from_queue(queue, rng.normal(0, TAT_NOISE_SD, (n_paths, horizon)))
+
+    # -------------------------------------------------
+    # Stress index + regime (same definitions as add_signals)
+    # -------------------------------------------------
+
+    utilization = np.clip(processed / capacity, 0, 1.5)
+
+    # Warm the rolling windows with the last observed days
+    lead = WINDOW - 1
+    queue_hist = np.broadcast_to(d["queue_size"].to_numpy()[-WINDOW:], (n_paths, WINDOW))
+    queue_delta = np.diff(np.concatenate([queue_hist, queue], axis=1), axis=1)
+    tat_hist = np.broadcast_to(d["avg_tat_days"].to_numpy()[-lead:], (n_paths, lead))
+    tat_ext = np.concatenate([tat_hist, tat], axis=1)
+
+    components = {
+        "utilization": utilization,
+        "queue_vel_mean_7d": sliding_window_view(queue_delta, WINDOW, axis=1).mean(axis=2),
+        "tat_std_7d": sliding_window_view(tat_ext, WINDOW, axis=1).std(axis=2, ddof=1),
+    }
+
+    stress = np.zeros((n_paths, horizon))
+    for col, w in STRESS_WEIGHTS.items():
+        mean = d[col].mean()
+        std = d[col].std()
+        std = 1.0 if not std else std
+        stress += w * (components[col] - mean) / std
+
+    stressed = stress >= STRESSED_THRESHOLD
+    days_to_stressed = np.where(stressed.any(axis=1), stressed.argmax(axis=1) + 1.0, np.nan)
+
+    return pd.DataFrame(
+        {
+            "path": np.arange(n_paths),
+            "days_to_stressed": days_to_stressed,
+            "peak_queue": queue.max(axis=1),
+            "final_queue": queue[:, -1],
+            "peak_stress": stress.max(axis=1),
+        }
+    )
+
+
+def summarize_scenario(paths: pd.DataFrame, horizon: int) -> dict:
+    """
+    Distribution summary of a simulated scenario:
+    - p_stressed: share of paths entering the stressed regime within the horizon
+    - days_to_stressed_p10/p50/p90: quantiles among paths that get stressed
+    - peak_queue_p10/p50/p90: quantiles of the peak queue over all paths
+    """
+    hit = paths["days_to_stressed"].dropna()
+    q = [0.1, 0.5, 0.9]
+    tts = hit.quantile(q).to_numpy() if len(hit) else np.full(3, np.nan)
+    peak = paths["peak_queue"].quantile(q).to_numpy()
+
+    return {
+        "horizon_days": horizon,
+        "paths": len(paths),
+        "p_stressed": round(len(hit) / len(paths), 3) if len(paths) else 0.0,
+        "days_to_stressed_p10": tts[0],
+        "days_to_stressed_p50": tts[1],
+        "days_to_stressed_p90": tts[2],
+        "peak_queue_p10": round(peak[0], 1),
+        "peak_queue_p50": round(peak[1], 1),
+        "peak_queue_p90": round(peak[2], 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate a what-if scenario for one center.")
+    parser.add_argument("--center", default="Delhi", help="Center to simulate")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--horizon", type=int, default=60, help="Days to simulate")
+    parser.add_argument("--paths", type=int, default=5000, help="Number of simulated paths")
+    parser.add_argument("--capacity", type=float, default=1.0, help="Capacity factor (e.g. 0.8 = 20%% cut)")
+    parser.add_argument("--demand", type=float, default=1.0, help="Demand factor (e.g. 1.2 = 20%% surge)")
+    parser.add_argument("--shock-start", type=int, default=0, help="First shocked day (0 = tomorrow)")
+    parser.add_argument("--shock-days", type=int, default=None, help="Shock duration (default: whole horizon)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    df["date"] = pd.to_datetime(df["date"])
+
+    t0 = time.perf_counter()
+    try:
+        paths = simulate_scenario(
+            df,
+            args.center,
+            horizon=args.horizon,
+            n_paths=args.paths,
+            capacity_factor=args.capacity,
+            demand_factor=args.demand,
+            shock_start_day=args.shock_start,
+            shock_days=args.shock_days,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - t0
+
+    print(f"Simulated {len(paths)} paths x {args.horizon} days for {args.center} in {elapsed:.3f}s")
+    for key, value in summarize_scenario(paths, args.horizon).items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Versioned signal history with as-of (time-travel) reads.
+
+`add_signals` normalizes over each center's full history and back-fills
+from later rows, so every pipeline run can rewrite past stress values and
+regimes. The history records each run as an append-only delta so any
+earlier run can be read back exactly as it was published:
+- rows that are new or changed since the previous run (within a small
+  float tolerance, so recomputation noise is not a change)
+- tombstones for (center, date) keys that disappeared
+
+Layout (under data/processed/signal_history/):
+
+    manifest.json     committed runs (run_id, created_at, rows, changed,
+                      deleted, note) and the center list used by the index
+    index.npz         one entry per row version: center, date, run, row,
+                      tombstone; sorted by (center, date, run)
+    runs/r000001/     that run's changed rows, one .npy per column (same
+                      layout as signal_store); deleted/ holds the tombstones
+
+Run directories are never modified once written. A run is committed by
+rewriting manifest.json last (tmp file + os.replace); index entries for
+uncommitted runs are ignored. Writers hold an exclusive lock file
+(`.lock`) while recording, and re-read the manifest under it, so concurrent
+pipeline runs (signals, ingest) get consecutive run ids. `as_of(run_or_date)` picks the newest
+version of each key with run <= the requested run from the index in one
+vectorized pass and gathers just those rows from the run files, so reads
+do not replay the history.
+
+Storage grows with changed rows. Note that a run which adds days to a
+center shifts that center's z-score statistics, so all of its rows are
+recorded again (the values did change); refreshes that leave a center's
+inputs alone record nothing for it.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/signal_history/
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from signal_store import read_column, write_columns
+
+HISTORY_DIR = Path("data/processed/signal_history")
+KEY = ["center", "date"]
+
+# values within this tolerance of the previous run are not a change
+RTOL = 1e-9
+ATOL = 1e-12
+
+INDEX_FIELDS = ("center", "date", "run", "row", "tombstone")
+RUN_FIELDS = ["run_id", "created_at", "rows", "changed", "deleted", "note"]
+
+# a lock older than this is left over from a crashed writer
+STALE_LOCK_SECONDS = 600
+
+
+@contextmanager
+def _lock(root: Path, timeout: float = 300.0):
+    """Exclusive writer lock: create `root/.lock` with O_EXCL, waiting up to `timeout` seconds."""
+    path = root / ".lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Signal history {root} is locked by another writer ({path})")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"])
+    return d.sort_values(KEY, kind="stable").reset_index(drop=True)
+
+
+def diff_rows(prev: pd.DataFrame, new: pd.DataFrame) -> tuple[np.ndarray, pd.DataFrame]:
+    """
+    Compare two signal tables keyed by (center, date). Returns (mask of
+    `new` rows that are added or changed, deleted keys). Numeric columns
+    compare with RTOL / ATOL (NaN equals NaN); other columns exactly; a
+    column missing from either side counts as changed.
+    """
+    p = prev.set_index(KEY)
+    n = new.set_index(KEY)
+    pos = p.index.get_indexer(n.index)
+    found = pos >= 0
+
+    changed = ~found
+    rows = pos[found]
+    for col in n.columns:
+        if col not in p.columns:
+            changed[found] = True
+            continue
+        a = n[col].to_numpy()[found]
+        b = p[col].to_numpy()[rows]
+        if pd.api.types.is_numeric_dtype(n[col]) and pd.api.types.is_numeric_dtype(p[col]):
+            same = np.isclose(a.astype(float), b.astype(float), rtol=RTOL, atol=ATOL, equal_nan=True)
+        else:
+            same = a.astype(str) == b.astype(str)
+        changed[found] |= ~same
+    if set(p.columns) - set(n.columns):
+        changed[found] = True
+
+    deleted = p.index[~p.index.isin(n.index)].to_frame(index=False)
+    return changed, deleted
+
+
+class SignalHistory:
+    """Append-only history of published signal tables."""
+
+    def __init__(self, root: str | Path = HISTORY_DIR):
+        self.root = Path(root)
+        self._load()
+
+    def _load(self) -> None:
+        path = self.root / "manifest.json"
+        self.manifest = json.loads(path.read_text()) if path.exists() else {"runs": [], "centers": []}
+        self._index: dict[str, np.ndarray] | None = None
+
+    # ---------- runs ----------
+
+    def runs(self) -> pd.DataFrame:
+        """Committed runs, oldest first."""
+        out = pd.DataFrame(self.manifest["runs"], columns=RUN_FIELDS)
+        out["created_at"] = pd.to_datetime(out["created_at"], utc=True)
+        return out
+
+    @property
+    def latest_run(self) -> int | None:
+        runs = self.manifest["runs"]
+        return runs[-1]["run_id"] if runs else None
+
+    def resolve(self, run_or_date: int | str | date | None = None) -> int:
+        """
+        Run id for `run_or_date`: None = latest run; an int (or digit
+        string) = that run; a date / timestamp = the last run created at
+        or before it (a bare date means the end of that day, UTC).
+        """
+        if self.latest_run is None:
+            raise FileNotFoundError(f"No runs recorded in {self.root}")
+        if run_or_date is None:
+            return self.latest_run
+        if isinstance(run_or_date, (int, np.integer)) or (isinstance(run_or_date, str) and run_or_date.isdigit()):
+            run = int(run_or_date)
+            if not any(r["run_id"] == run for r in self.manifest["runs"]):
+                raise ValueError(f"Unknown run {run}")
+            return run
+
+        day_only = (isinstance(run_or_date, date) and not isinstance(run_or_date, datetime)) or (
+            isinstance(run_or_date, str) and len(run_or_date) <= 10
+        )
+        ts = pd.Timestamp(run_or_date)
+        ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+        if day_only:
+            ts = ts + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+
+        runs = self.runs()
+        before = runs[runs["created_at"] <= ts]
+        if before.empty:
+            raise ValueError(f"No run recorded on or before {run_or_date}")
+        return int(before["run_id"].iloc[-1])
+
+    # ---------- index ----------
+
+    def index(self) -> dict[str, np.ndarray]:
+        """Row-version index for committed runs."""
+        if self._index is None:
+            path = self.root / "index.npz"
+            if path.exists():
+                with np.load(path) as z:
+                    idx = {k: z[k] for k in INDEX_FIELDS}
+                committed = idx["run"] <= (self.latest_run or 0)
+                self._index = {k: v[committed] for k, v in idx.items()}
+            else:
+                self._index = {
+                    "center": np.empty(0, np.int32),
+                    "date": np.empty(0, np.int64),
+                    "run": np.empty(0, np.int32),
+                    "row": np.empty(0, np.int32),
+                    "tombstone": np.empty(0, bool),
+                }
+        return self._index
+
+    def changed_centers(self, since_run: int) -> list[str]:
+        """Centers with rows changed or deleted by runs after `since_run`."""
+        idx = self.index()
+        codes = np.unique(idx["center"][idx["run"] > since_run])
+        return [self.manifest["centers"][i] for i in codes]
+
+    def _run_dir(self, run: int) -> Path:
+        return self.root / "runs" / f"r{run:06d}"
+
+    # ---------- reads ----------
+
+    def as_of(
+        self,
+        run_or_date: int | str | date | None = None,
+        center: str | None = None,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """The signals table as published by run `run_or_date` (see `resolve`)."""
+        run = self.resolve(run_or_date)
+        idx = self.index()
+
+        upto = idx["run"] <= run
+        # rows are sorted by (center, date, run): the newest version <= run is
+        # the last selected row of its key
+        same_next = np.r_[(idx["center"][1:] == idx["center"][:-1]) & (idx["date"][1:] == idx["date"][:-1]), False]
+        newer = np.r_[upto[1:], False] & same_next
+        live = upto & ~newer & ~idx["tombstone"]
+        if center is not None:
+            if center not in self.manifest["centers"]:
+                raise KeyError(f"Unknown center '{center}'")
+            live &= idx["center"] == self.manifest["centers"].index(center)
+
+        sel = np.flatnonzero(live)
+        want = list(dict.fromkeys([*KEY, *columns])) if columns else None
+        frames = []
+        for r in np.unique(idx["run"][sel]):
+            rows = np.sort(idx["row"][sel[idx["run"][sel] == r]])
+            path = self._run_dir(int(r))
+            meta = json.loads((path / "meta.json").read_text())
+            cols = [c for c in (want or meta["columns"]) if c in meta["columns"]]
+            frames.append(pd.DataFrame({c: read_column(path, meta, c, rows) for c in cols}))
+
+        if not frames:
+            return pd.DataFrame(columns=want or KEY)
+        return _prepare(pd.concat(frames, ignore_index=True))
+
+    # ---------- writes ----------
+
+    def record(
+        self,
+        df: pd.DataFrame,
+        centers: set[str] | None = None,
+        note: str = "",
+    ) -> dict:
+        """
+        Record a pipeline run publishing `df`. With `centers`, only those
+        centers are compared (others are taken as unchanged; ignored for the
+        first run). Returns the manifest entry of the new run.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with _lock(self.root):
+            # another writer may have committed runs since this instance was loaded
+            self._load()
+            return self._record(df, centers, note)
+
+    def _record(self, df: pd.DataFrame, centers: set[str] | None, note: str) -> dict:
+        new = _prepare(df)
+        prev = self.as_of() if self.latest_run is not None else new.iloc[:0]
+        if centers is not None and self.latest_run is not None:
+            new = new[new["center"].isin(centers)].reset_index(drop=True)
+            prev = prev[prev["center"].isin(centers)].reset_index(drop=True)
+        changed, deleted = diff_rows(prev, new)
+        delta = new[changed].reset_index(drop=True)
+
+        total = self.manifest["runs"][-1]["rows"] if self.manifest["runs"] else 0
+        run = (self.latest_run or 0) + 1
+        final = self._run_dir(run)
+        tmp = final.with_name(f".tmp-{final.name}")
+        for p in (final, tmp):
+            shutil.rmtree(p, ignore_errors=True)  # leftovers of an uncommitted run
+        (tmp / "deleted").mkdir(parents=True)
+        meta = {"run_id": run, "rows": len(delta), **write_columns(delta, tmp)}
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+        dmeta = write_columns(deleted, tmp / "deleted")
+        (tmp / "deleted" / "meta.json").write_text(json.dumps(dmeta, indent=2))
+        os.replace(tmp, final)
+
+        # index: append this run's versions, keep sorted by (center, date, run)
+        names = self.manifest["centers"]
+        pos = {c: i for i, c in enumerate(names)}
+        keys = pd.concat([delta[KEY], deleted], ignore_index=True)
+        for c in keys["center"].unique():
+            if c not in pos:
+                pos[c] = len(names)
+                names.append(c)
+        add = {
+            "center": keys["center"].map(pos).to_numpy(dtype=np.int32),
+            "date": keys["date"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+            "run": np.full(len(keys), run, dtype=np.int32),
+            "row": np.r_[np.arange(len(delta)), np.arange(len(deleted))].astype(np.int32),
+            "tombstone": np.r_[np.zeros(len(delta), bool), np.ones(len(deleted), bool)],
+        }
+        idx = self.index()
+        merged = {k: np.concatenate([idx[k], add[k]]) for k in INDEX_FIELDS}
+        order = np.lexsort((merged["run"], merged["date"], merged["center"]))
+        merged = {k: v[order] for k, v in merged.items()}
+        _atomic_write(self.root / "index.npz", lambda f: np.savez(f, **merged))
+
+        entry = {
+            "run_id": run,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "rows": len(new) if centers is None else total - len(prev) + len(new),
+            "changed": int(changed.sum()),
+            "deleted": len(deleted),
+            "note": note,
+        }
+        self.manifest["runs"].append(entry)
+        self.manifest["centers"] = names
+        _atomic_write(self.root / "manifest.json", lambda f: f.write(json.dumps(self.manifest, indent=2).encode()))
+        self._index = merged
+        return entry
+
+
+def record_run(
+    df: pd.DataFrame,
+    root: str | Path = HISTORY_DIR,
+    centers: set[str] | None = None,
+    note: str = "",
+) -> dict:
+    """Record `df` as a new run of the history at `root`."""
+    return SignalHistory(root).record(df, centers=centers, note=note)
+
+
+def load_as_of(run_or_date: int | str | date | None, root: str | Path = HISTORY_DIR) -> pd.DataFrame:
+    """Signals as published by `run_or_date` (see `SignalHistory.resolve`)."""
+    return SignalHistory(root).as_of(run_or_date)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record / query the versioned signal history.")
+    parser.add_argument("--root", default=str(HISTORY_DIR), help="History directory")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="Record the signals CSV as a new run")
+    rec.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    rec.add_argument("--note", default="", help="Free-text note stored with the run")
+
+    sub.add_parser("runs", help="List recorded runs")
+
+    q = sub.add_parser("as-of", help="Print / export the table as of a run or date")
+    q.add_argument("run_or_date", help="Run id or date (YYYY-MM-DD, end of day UTC)")
+    q.add_argument("--center", default=None, help="Only this center")
+    q.add_argument("--output", default=None, help="Write the table to this CSV")
+    args = parser.parse_args()
+
+    hist = SignalHistory(args.root)
+    if args.cmd == "record":
+        df = pd.read_csv(args.input)
+        t0 = time.perf_counter()
+        entry = hist.record(df, note=args.note)
+        print(f"Recorded run {entry['run_id']}: {entry['changed']} changed, {entry['deleted']} deleted "
+              f"({time.perf_counter() - t0:.2f}s)")
+    elif args.cmd == "runs":
+        print(hist.runs().to_string(index=False))
+    else:
+        t0 = time.perf_counter()
+        run = hist.resolve(args.run_or_date)
+        out = hist.as_of(run, center=args.center)
+        print(f"Run {run}: {len(out)} rows in {time.perf_counter() - t0:.3f}s")
+        if args.output:
+            out.to_csv(args.output, index=False, date_format="%Y-%m-%d")
+            print(f"-> {args.output}")
+        else:
+            print(out.tail(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Memory-mapped column store for the signals table.
+
+The signals pipeline publishes its output as one `.npy` file per column plus
+a small index, so every reader (dashboard replicas, report workers, batch
+jobs) maps the same files read-only and shares the OS page cache instead of
+parsing the CSV into a private frame.
+
+Layout (under data/processed/signal_store/):
+
+    CURRENT                  name of the live version (swapped atomically)
+    v<time_ns>-<pid>/
+        meta.json            columns, dtypes, string categories, centers
+        offsets.npy          row offset of each center (len = centers + 1)
+        <column>.npy         one array per column; strings as int32 codes
+
+Rows are sorted by (center, date), so a center is a contiguous slice.
+A version directory is written in full before `CURRENT` is replaced with
+`os.replace`, so readers only ever see complete stores. Readers map every
+column when they open a version, so pruning old versions (only the last
+KEEP_VERSIONS are kept) does not pull files from under a reader that holds
+on to one: the mappings stay valid until the reader lets go.
+
+Reads:  data/processed/visaops_signals.csv
+Writes: data/processed/signal_store/
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = Path("data/processed/signal_store")
+KEEP_VERSIONS = 3
+
+
+def _pointer(root: Path) -> Path:
+    return root / "CURRENT"
+
+
+def write_columns(d: pd.DataFrame, path: Path) -> dict:
+    """
+    Save each column of `d` as `<path>/<column>.npy` and return the column
+    metadata ({"columns": dtypes, "categories": string categories}).
+    """
+    meta = {"columns": {}, "categories": {}}
+    for col in d.columns:
+        s = d[col]
+        if col == "date":
+            arr = s.to_numpy(dtype="datetime64[ns]")
+            meta["columns"][col] = "datetime64[ns]"
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            arr = s.to_numpy()
+            meta["columns"][col] = str(arr.dtype)
+        else:
+            codes, cats = pd.factorize(s.astype(str), sort=True)
+            arr = codes.astype(np.int32)
+            meta["columns"][col] = "category"
+            meta["categories"][col] = list(cats)
+        np.save(path / f"{col}.npy", np.ascontiguousarray(arr))
+    return meta
+
+
+def read_column(path: Path, meta: dict, col: str, rows: np.ndarray | slice = slice(None)) -> pd.Series:
+    """One column saved by `write_columns`, memory-mapped, with category codes decoded."""
+    arr = np.load(path / f"{col}.npy", mmap_mode="r")[rows]
+    if meta["columns"][col] == "category":
+        return pd.Series(np.asarray(meta["categories"][col], dtype=object)[arr], copy=False)
+    return pd.Series(arr, copy=False)
+
+
+def publish(df: pd.DataFrame, root: str | Path = STORE_DIR, keep: int = KEEP_VERSIONS) -> Path:
+    """
+    Write `df` as a new store version and make it current. Returns the
+    version directory. Numeric columns are stored as-is, dates as
+    datetime64[ns] and everything else as categorical int32 codes.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    d = df.copy()
+    d["date"] = pd.to_datetime(d["date"])
+    d = d.sort_values(["center", "date"], kind="stable").reset_index(drop=True)
+
+    name = f"v{time.time_ns()}-{os.getpid()}"
+    tmp = root / f".tmp-{name}"
+    tmp.mkdir()
+
+    meta = {"version": name, "rows": len(d), **write_columns(d, tmp)}
+
+    codes = np.load(tmp / "center.npy")
+    n_centers = len(meta["categories"]["center"])
+    offsets = np.searchsorted(codes, np.arange(n_centers + 1)).astype(np.int64)
+    np.save(tmp / "offsets.npy", offsets)
+    meta["centers"] = meta["categories"]["center"]
+
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    # version dir first, then the pointer: readers see either the old or the new store
+    final = root / name
+    os.replace(tmp, final)
+    pointer_tmp = root / f".CURRENT-{name}"
+    pointer_tmp.write_text(name)
+    os.replace(pointer_tmp, _pointer(root))
+
+    _prune(root, keep)
+    return final
+
+
+def _prune(root: Path, keep: int) -> None:
+    current = _pointer(root).read_text().strip()
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for old in versions[: max(0, len(versions) - keep)]:
+        if old.name != current:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def exists(root: str | Path = STORE_DIR) -> bool:
+    return _pointer(Path(root)).exists()
+
+
+def current_version(root: str | Path = STORE_DIR) -> str | None:
+    """Name of the live version, or None if nothing was published."""
+    pointer = _pointer(Path(root))
+    return pointer.read_text().strip() if pointer.exists() else None
+
+
+class SignalStore:
+    """
+    Read-only view of the current store version.
+
+    Columns are `np.load(..., mmap_mode="r")` arrays, all mapped on open:
+    attaching is cheap, pages are shared between every process reading the
+    same version, and the version stays readable after it is pruned. Call
+    `refresh()` to pick up a newer version published since opening.
+    """
+
+    def __init__(self, root: str | Path = STORE_DIR):
+        self.root = Path(root)
+        self._open(_pointer(self.root).read_text().strip())
+
+    def _open(self, version: str) -> None:
+        self.version = version
+        self.path = self.root / version
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self.centers: list[str] = self.meta["centers"]
+        self.offsets = np.load(self.path / "offsets.npy")
+        self._center_pos = {c: i for i, c in enumerate(self.centers)}
+        self._cols = {c: np.load(self.path / f"{c}.npy", mmap_mode="r") for c in self.meta["columns"]}
+
+    def refresh(self) -> bool:
+        """Switch to the current version if it changed; True if it did."""
+        version = _pointer(self.root).read_text().strip()
+        if version == self.version:
+            return False
+        self._open(version)
+        return True
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.meta["columns"])
+
+    def __len__(self) -> int:
+        return int(self.meta["rows"])
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw memory-mapped array (category columns as int32 codes)."""
+        if name not in self._cols:
+            raise KeyError(f"Unknown column '{name}'")
+        return self._cols[name]
+
+    def rows(self, center: str) -> slice:
+        """Row slice of `center` (rows are sorted by center, date)."""
+        i = self._center_pos[center]
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def frame(
+        self,
+        center: str | None = None,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """
+        DataFrame over all rows or one center. Numeric and date columns
+        wrap the mapped arrays without copying; string columns are decoded
+        from their codes (one pointer per row, strings shared).
+        """
+        sl = self.rows(center) if center is not None else slice(None)
+        data = {}
+        for col in columns or self.columns:
+            arr = self.column(col)[sl]
+            if self.meta["columns"][col] == "category":
+                cats = np.asarray(self.meta["categories"][col], dtype=object)
+                data[col] = pd.Series(cats[arr], copy=False)
+            else:
+                data[col] = pd.Series(arr, copy=False)
+        return pd.DataFrame(data, copy=False)
+
+    def latest(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Last row of every center."""
+        idx = self.offsets[1:] - 1
+        idx = idx[self.offsets[1:] > self.offsets[:-1]]
+        return self.frame(columns=columns).iloc[idx].reset_index(drop=True)
+
+
+def load_signals(
+    csv_path: str | Path = "data/processed/visaops_signals.csv",
+    root: str | Path = STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Signals as a DataFrame: mapped from the store when it is at least as
+    new as the CSV, otherwise parsed from the CSV.
+    """
+    csv_path, root = Path(csv_path), Path(root)
+    if exists(root) and (
+        not csv_path.exists() or _pointer(root).stat().st_mtime >= csv_path.stat().st_mtime
+    ):
+        return SignalStore(root).frame()
+
+    df = pd.read_csv(csv_path)
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish signals to the memory-mapped store.")
+    parser.add_argument("--input", default="data/processed/visaops_signals.csv", help="Input signals CSV")
+    parser.add_argument("--root", default=str(STORE_DIR), help="Store directory")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="Versions to keep")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    t0 = time.perf_counter()
+    path = publish(df, args.root, keep=args.keep)
+    print(f"Published {len(df)} rows -> {path} ({time.perf_counter() - t0:.2f}s)")
+
+    t0 = time.perf_counter()
+    store = SignalStore(args.root)
+    frame = store.frame()
+    print(f"Attached {len(store.centers)} centers, {len(frame)} rows in {time.perf_counter() - t0:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,41 @@ Writes: data/processed/visaops_signals.csv
 
 from __future__ import annotations
 
+import argparse
+
+import numpy as np
 import pandas as pd
 
+from data_quality import FILL_POLICIES, summarize_quality, validate_daily
+from signal_history import record_run
+from signal_store import publish
+
+# Regime cut-offs on the stress index:
+# stable < STABLE_THRESHOLD <= elevated < STRESSED_THRESHOLD <= stressed
+STABLE_THRESHOLD = -0.5
+STRESSED_THRESHOLD = 0.75
+REGIMES = ("stable", "elevated", "stressed")
+
+# Stress index weights on the center-normalized (z-scored) components
+STRESS_WEIGHTS = {
+    "utilization": 0.5,
+    "queue_vel_mean_7d": 0.3,
+    "tat_std_7d": 0.2,
+}
+
+
+def label_regimes(stress: np.ndarray) -> np.ndarray:
+    """
+    Vectorized regime labeling for an array of stress index values
+    (any shape). Returns an array of regime labels of the same shape.
+    """
+    stress = np.asarray(stress, dtype=float)
+    return np.select(
+        [stress < STABLE_THRESHOLD, stress < STRESSED_THRESHOLD],
+        [REGIMES[0], REGIMES[1]],
+        default=REGIMES[2],
+    )
+
 
 def add_signals(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -77,44 +110,46 @@ def add_signals(df: pd.DataFrame) -> pd.DataFrame:
     # -------------------------------------------------
 
     # Normalize components within each center (z-score)
-    for col in ["utilization", "queue_vel_mean_7d", "tat_std_7d"]:
+    for col in STRESS_WEIGHTS:
         mean = g[col].transform("mean")
         std = g[col].transform("std").replace(0, 1.0)
         df[f"{col}_z"] = (df[col] - mean) / std
 
     # Interpretable weighted stress index
-    df["stress_index"] = (
-        0.5 * df["utilization_z"]
-        + 0.3 * df["queue_vel_mean_7d_z"]
-        + 0.2 * df["tat_std_7d_z"]
-    )
+    df["stress_index"] = sum(w * df[f"{col}_z"] for col, w in STRESS_WEIGHTS.items())
 
     # -------------------------------------------------
     # Simple Regime Labels
     # -------------------------------------------------
 
-    def label_regime(x: float) -> str:
-        if x < -0.5:
-            return "stable"
-        elif x < 0.75:
-            return "elevated"
-        else:
-            return "stressed"
-
-    df["regime"] = df["stress_index"].apply(label_regime)
+    df["regime"] = label_regimes(df["stress_index"].to_numpy())
 
     return df
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Compute signals from the daily ops snapshots.")
+    parser.add_argument("--fill", default="ffill", choices=FILL_POLICIES, help="Gap fill policy for data validation")
+    args = parser.parse_args()
+
     inp = "data/processed/visaops_daily.csv"
     outp = "data/processed/visaops_signals.csv"
 
+    from rollups import build_rollups  # imports REGIMES from this module
+
     df = pd.read_csv(inp)
+    df, quality = validate_daily(df, fill=args.fill)
+    print(f"Data quality: {summarize_quality(quality)}")
+
     feats = add_signals(df)
     feats.to_csv(outp, index=False)
+    store = publish(feats)
+    run = record_run(feats)
+    rollups = build_rollups(feats, outp)
 
-    print(f"Saved {len(feats)} rows -> {outp}")
+    print(f"Saved {len(feats)} rows -> {outp} (memory-mapped store: {store})")
+    print(f"History: run {run['run_id']} ({run['changed']} rows changed, {run['deleted']} deleted)")
+    print("Rollups: " + ", ".join(f"{res} {n} rows" for res, n in rollups.items()))
     print(
         feats[
             [
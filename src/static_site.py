@@ -0,0 +1,287 @@
+"""
+Static HTML site: an index page plus one page per center.
+
+Center pages use the PDF report's `HTML_TEMPLATE` and `compute_7d_drivers`
+(status, week-over-week drivers, embedded stress & regime chart), so the
+daily risk view can be served to any number of readers as plain files.
+
+Builds are incremental. Each page's content hash covers the center's
+signal rows and the page template; `manifest.json` remembers the hash of
+every page written, and only centers whose hash changed (or whose page is
+missing) are rendered again. Pages of removed centers are deleted. The
+index is cheap and rewritten on every build.
+
+Changed pages are rendered in a process pool: centers are split into one
+chunk per worker, and each worker reuses one chart figure for its chunk
+(as in `charts.render_centers`). Pages are written to a temp file and
+swapped in, and the manifest is written last, so an interrupted build only
+causes those pages to be rebuilt next time.
+
+Reads:  data/processed/visaops_signals.csv (or the memory-mapped store)
+Writes: site/index.html, site/centers/<center>.html, site/manifest.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import html
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import markdown
+import numpy as np
+import pandas as pd
+
+from charts import new_chart, render_center, safe_name
+from drivers import driver_summary, driver_table
+from report_generator import HTML_TEMPLATE, REPORT_CSS, compute_7d_drivers, load_signals
+from rollups import load_range
+
+SITE_DIR = Path("site")
+
+# bump to force a full rebuild when page rendering changes outside the template
+SITE_VERSION = "2"
+
+INDEX_TEMPLATE = """
+<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>VisaOps Risk — All Centers</title>
+<style>""" + REPORT_CSS + """</style>
+</head>
+<body>
+
+<h1>VisaOps Risk — All Centers</h1>
+<p>Data through <strong>{as_of}</strong>. {counts}</p>
+
+<table>
+<tr>
+<th>Center</th>
+<th>Regime</th>
+<th>Stress Index</th>
+<th>Δ 7d</th>
+<th>Avg TAT (days)</th>
+<th>Queue Size</th>
+<th>Utilization</th>
+<th>Last 7 days</th>
+</tr>
+{rows}
+</table>
+
+<hr>
+<div class="footnote">
+Generated by VisaOps Risk Console (demo). Data is synthetic and non-sensitive.
+</div>
+
+</body>
+</html>
+"""
+
+
+def page_name(center: str) -> str:
+    """File name for a center's page (safe for any center label, see `charts.safe_name`)."""
+    return f"centers/{safe_name(center)}.html"
+
+
+def content_hashes(df: pd.DataFrame) -> dict[str, str]:
+    """
+    Content hash per center: its signal rows (all columns, in date order)
+    plus the page template and SITE_VERSION. Floats are rounded first so
+    the same data read from the CSV or the store hashes the same.
+    """
+    d = df.sort_values(["center", "date"], kind="stable").reset_index(drop=True)
+    floats = d.select_dtypes("float").columns
+    d[floats] = d[floats].round(6)
+    row_hash = pd.util.hash_pandas_object(d[sorted(d.columns)], index=False).to_numpy()
+    codes, centers = pd.factorize(d["center"], sort=True)
+    bounds = np.searchsorted(codes, np.arange(len(centers) + 1))
+
+    salt = hashlib.sha1((SITE_VERSION + HTML_TEMPLATE).encode()).digest()
+    out = {}
+    for i, c in enumerate(centers):
+        h = hashlib.sha1(salt)
+        h.update(row_hash[bounds[i] : bounds[i + 1]].tobytes())
+        out[c] = h.hexdigest()[:16]
+    return out
+
+
+# -------------------------------------------------
+# Center pages (process pool)
+# -------------------------------------------------
+
+_WORKER_GROUPS: dict[str, pd.DataFrame] = {}
+
+
+def _init_worker(df: pd.DataFrame) -> None:
+    global _WORKER_GROUPS
+    _WORKER_GROUPS = dict(tuple(df.groupby("center")))
+
+
+def center_page(d: pd.DataFrame, center: str, chart=None, dpi: int = 110) -> str:
+    """One center's page from its signal rows."""
+    d = d.sort_values("date")
+    last = d.iloc[-1]
+    content = "\n".join(
+        [
+            "[← All centers](../index.html)",
+            "",
+            f"# VisaOps Risk — {html.escape(center)}",
+            "",
+            f"Data through **{pd.Timestamp(last['date']):%Y-%m-%d}**",
+            "",
+            "## Current Status",
+            f"- Regime: **{last['regime']}**",
+            f"- Stress Index: **{float(last['stress_index']):.2f}**",
+            f"- Avg TAT (days): **{float(last['avg_tat_days']):.2f}**",
+            f"- Queue Size: **{float(last['queue_size']):.0f}**",
+            f"- Utilization: **{float(last['utilization']):.2f}**",
+        ]
+    )
+
+    driver_rows, summary = compute_7d_drivers(d, center)
+
+    # resolution follows the history length, aggregated from these rows
+    rows, _ = load_range(center, daily=d, materialized=False)
+    fig = render_center(rows.assign(center=center), center, chart=chart)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi)
+
+    return HTML_TEMPLATE.format(
+        content=markdown.markdown(content),
+        center=html.escape(center),
+        driver_rows="\n".join(driver_rows),
+        driver_summary=html.escape(summary),
+        figure_b64=base64.b64encode(buf.getvalue()).decode(),
+    )
+
+
+def _write_page(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _render_chunk(centers: list[str], out_dir: str) -> list[str]:
+    chart = new_chart()
+    for center in centers:
+        _write_page(Path(out_dir) / page_name(center), center_page(_WORKER_GROUPS[center], center, chart))
+    return centers
+
+
+def render_pages(
+    df: pd.DataFrame,
+    centers: list[str],
+    out_dir: str | Path,
+    processes: int | None = None,
+) -> list[str]:
+    """Render pages for `centers` into `out_dir`. `processes=1` renders in-process."""
+    if not centers:
+        return []
+    df = df[df["center"].isin(centers)]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(centers)))
+    chunks = [list(c) for c in np.array_split(np.asarray(centers, dtype=object), processes) if len(c)]
+
+    if processes == 1:
+        _init_worker(df)
+        return [c for chunk in chunks for c in _render_chunk(chunk, str(out_dir))]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(df,)) as pool:
+        results = pool.map(_render_chunk, chunks, [str(out_dir)] * len(chunks))
+        return [c for chunk in results for c in chunk]
+
+
+# -------------------------------------------------
+# Index + build
+# -------------------------------------------------
+
+def index_page(df: pd.DataFrame) -> str:
+    latest = df.sort_values("date").groupby("center").tail(1).sort_values("stress_index", ascending=False)
+    summary = driver_summary(driver_table(df)).set_index("center")
+
+    rows = []
+    for r in latest.itertuples(index=False):
+        s = summary.loc[r.center]
+        rows.append(
+            f'<tr><td><a href="{page_name(r.center)}">{html.escape(r.center)}</a></td>'
+            f"<td>{r.regime}</td>"
+            f"<td>{r.stress_index:.2f}</td>"
+            f"<td>{s['stress_delta']:+.2f}</td>"
+            f"<td>{r.avg_tat_days:.2f}</td>"
+            f"<td>{r.queue_size:.0f}</td>"
+            f"<td>{r.utilization:.2f}</td>"
+            f"<td>{html.escape(s['summary'])}</td></tr>"
+        )
+    counts = latest["regime"].value_counts()
+    return INDEX_TEMPLATE.format(
+        as_of=f"{pd.Timestamp(df['date'].max()):%Y-%m-%d}",
+        counts=", ".join(f"{counts.get(r, 0)} {r}" for r in ("stressed", "elevated", "stable")) + f" of {len(latest)} centers.",
+        rows="\n".join(rows),
+    )
+
+
+def build_site(
+    df: pd.DataFrame,
+    out_dir: str | Path = SITE_DIR,
+    processes: int | None = None,
+    force: bool = False,
+) -> dict:
+    """
+    Build / refresh the site in `out_dir` from `df` (signals). Returns
+    counts of pages rendered, unchanged and removed.
+    """
+    out_dir = Path(out_dir)
+    manifest_path = out_dir / "manifest.json"
+    old = {} if force or not manifest_path.exists() else json.loads(manifest_path.read_text())["pages"]
+
+    # one date unit whatever the source (CSV, store, history), so hashes are stable
+    df = df.assign(date=pd.to_datetime(df["date"]).astype("datetime64[ns]"))
+    hashes = content_hashes(df)
+    todo = [
+        c for c, h in hashes.items()
+        if old.get(c, {}).get("hash") != h or not (out_dir / page_name(c)).exists()
+    ]
+
+    render_pages(df, todo, out_dir, processes)
+
+    # pages of removed centers, and pages written under an older naming scheme
+    removed = [c for c in old if c not in hashes]
+    for c, entry in old.items():
+        page = entry.get("page", page_name(c))
+        if c not in hashes or page != page_name(c):
+            (out_dir / page).unlink(missing_ok=True)
+
+    _write_page(out_dir / "index.html", index_page(df))
+    pages = {c: {"hash": h, "page": page_name(c)} for c, h in hashes.items()}
+    _write_page(manifest_path, json.dumps({"version": SITE_VERSION, "pages": pages}, indent=2))
+    return {"rendered": len(todo), "unchanged": len(hashes) - len(todo), "removed": len(removed)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the static HTML risk site (index + one page per center).")
+    parser.add_argument("--input", default=None, help="Signals CSV (default: store / data/processed/visaops_signals.csv)")
+    parser.add_argument("--output", default=str(SITE_DIR), help="Site directory")
+    parser.add_argument("--as-of", default=None, help="Build from a history run id or date instead of the latest signals")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Re-render every page")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input) if args.input else load_signals(args.as_of)
+
+    t0 = time.perf_counter()
+    stats = build_site(df, args.output, args.processes, args.force)
+    print(
+        f"Site -> {args.output}/index.html: {stats['rendered']} pages rendered, "
+        f"{stats['unchanged']} unchanged, {stats['removed']} removed in {time.perf_counter() - t0:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()